@@ -42,15 +42,21 @@ Fonctionnalites avancees:
         'data/bike_category_data.xml',
         'data/bike_sequence_data.xml',
         'data/rental_pricing_data.xml',
+        'data/ir_cron_data.xml',
         # Views
         'views/bike_views.xml',
         'views/accessory_views.xml',
         'views/rental_views.xml',
         'views/rental_contract_views.xml',
         'views/customer_views.xml',
+        'views/rental_batch_job_views.xml',
+        'views/catalog_import_views.xml',
+        'views/image_import_views.xml',
         # Wizards (must be before menus)
         'wizard/rental_wizard_views.xml',
         'wizard/extend_rental_wizard_views.xml',
+        'wizard/rental_invoice_wizard_views.xml',
+        'wizard/accessory_restock_wizard_views.xml',
         # Reports (must be before menus)
         'report/rental_report_views.xml',
         'report/sales_report_views.xml',
@@ -1 +1,3 @@
 from . import main
+from . import planning
+from . import kiosk
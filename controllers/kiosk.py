@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+
+from odoo import fields, http
+from odoo.http import request
+
+from odoo.addons.bike_shop.models.rental_pricing import DURATION_HOURS
+
+# Nombre maximum de demandes par appel
+KIOSK_MAX_ITEMS = 200
+# Duree de vie (secondes) et taille du cache des reponses
+KIOSK_CACHE_TTL = 10
+KIOSK_CACHE_SIZE = 512
+# Appels autorises par adresse IP et par fenetre (secondes)
+KIOSK_RATE_LIMIT = 120
+KIOSK_RATE_WINDOW = 60
+
+
+class _ResponseCache:
+    """Cache LRU a duree de vie courte, partage par les threads d'un worker."""
+
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+class _RateLimiter:
+    """Limite a fenetre fixe par cle (adresse IP), en memoire du worker."""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def hit(self, key):
+        """Compte un appel; retourne le delai d'attente en secondes si la limite est atteinte."""
+        now = time.monotonic()
+        with self.lock:
+            if len(self.counters) > 10000:
+                self.counters = {k: v for k, v in self.counters.items() if v[0] + self.window > now}
+            start, count = self.counters.get(key, (now, 0))
+            if start + self.window <= now:
+                start, count = now, 0
+            if count >= self.limit:
+                return int(start + self.window - now) + 1
+            self.counters[key] = (start, count + 1)
+            return 0
+
+
+_response_cache = _ResponseCache(KIOSK_CACHE_TTL, KIOSK_CACHE_SIZE)
+_rate_limiter = _RateLimiter(KIOSK_RATE_LIMIT, KIOSK_RATE_WINDOW)
+
+
+class BikeShopKiosk(http.Controller):
+
+    @http.route('/bike_shop/api/availability', type='json', auth='public', website=True, cors='*')
+    def kiosk_availability(self, items=None, **kwargs):
+        """Disponibilite et devis pour un lot de demandes, en un aller-retour.
+
+        Chaque demande porte sur ``bike_id`` ou ``bike_type``, avec ``date_start``,
+        ``date_end`` et ``duration_type`` (jour par defaut). Les reponses sont
+        renvoyees dans l'ordre des demandes.
+        """
+        retry_after = _rate_limiter.hit(request.httprequest.remote_addr)
+        if retry_after:
+            return {'error': 'rate_limited', 'retry_after': retry_after}
+        if not isinstance(items, list) or not items:
+            return {'error': 'invalid_request', 'message': "Le parametre 'items' doit etre une liste non vide."}
+        if len(items) > KIOSK_MAX_ITEMS:
+            return {'error': 'too_many_items', 'max_items': KIOSK_MAX_ITEMS}
+
+        company = request.website.company_id
+        requests = [self._parse_item(item) for item in items]
+        cache_key = (request.db, company.id, tuple(requests))
+        result = _response_cache.get(cache_key)
+        if result is None:
+            result = self._compute_availability(company, requests)
+            _response_cache.set(cache_key, result)
+        return result
+
+    def _parse_item(self, item):
+        """Demande normalisee (bike_id, bike_type, debut, fin, duree) ou message d'erreur."""
+        if not isinstance(item, dict):
+            return "Demande invalide."
+        try:
+            bike_id = int(item['bike_id']) if item.get('bike_id') else None
+            date_start = fields.Datetime.to_datetime(item.get('date_start'))
+            date_end = fields.Datetime.to_datetime(item.get('date_end'))
+        except (TypeError, ValueError):
+            return "Identifiant ou date invalide."
+        bike_type = item.get('bike_type') or None
+        duration_type = item.get('duration_type') or 'day'
+        if not bike_id and not bike_type:
+            return "Indiquez un velo (bike_id) ou un type de velo (bike_type)."
+        if not date_start or not date_end or date_end <= date_start:
+            return "La date de fin doit etre posterieure a la date de debut."
+        if duration_type not in DURATION_HOURS:
+            return f"Type de duree inconnu: {duration_type}"
+        return (bike_id, bike_type, date_start, date_end, duration_type)
+
+    def _compute_availability(self, company, requests):
+        env = request.env(su=True)
+        valid = [req for req in requests if isinstance(req, tuple)]
+        Bike = env['bike.bike'].with_company(company)
+        available = Bike._get_available_bike_ids_batch([req[:4] for req in valid])
+        quotes = env['bike.rental.pricing'].with_company(company).quote_items(valid)
+
+        computed = iter(zip(available, quotes))
+        results = []
+        for req in requests:
+            if not isinstance(req, tuple):
+                results.append({'error': req})
+                continue
+            bike_ids, quote = next(computed)
+            results.append({
+                'available': bool(bike_ids),
+                'bike_ids': bike_ids,
+                'quote': quote,
+            })
+        return {
+            'currency': company.currency_id.name,
+            'ttl': KIOSK_CACHE_TTL,
+            'results': results,
+        }
@@ -1,6 +1,26 @@
-from odoo import http
+import hashlib
+from urllib.parse import urlencode
+
+from odoo import fields, http
 from odoo.http import request
 
+from odoo.addons.bike_shop.models.bike import CATALOG_FACETS, CATALOG_FILTERS, PRICE_BUCKETS
+
+CATALOG_PAGE_SIZE = 24
+CATALOG_MAX_PAGE_SIZE = 96
+
+# Variantes d'image par usage: (champ par defaut, champs proposes dans le srcset)
+IMAGE_VARIANTS = {
+    'card': ('image_256', ('image_256', 'image_512', 'image_1024')),
+    'detail': ('image_1024', ('image_512', 'image_1024', 'image_1920')),
+}
+IMAGE_WIDTHS = {
+    'image_256': 256,
+    'image_512': 512,
+    'image_1024': 1024,
+    'image_1920': 1920,
+}
+
 
 class BikeShopWebsite(http.Controller):
 
@@ -12,30 +32,171 @@ class BikeShopWebsite(http.Controller):
     def shop_redirect(self, **kwargs):
         return request.redirect('/shop/bikes')
 
-    @http.route('/shop/bikes', type='http', auth='public', website=True)
-    def bikes_catalog(self, bike_type=None, category_id=None, **kwargs):
-        domain = [
-            ('is_for_sale', '=', True),
-            ('state', '=', 'available'),
-            ('stock_quantity', '>', 0),
-        ]
-        
-        if bike_type:
-            domain.append(('bike_type', '=', bike_type))
-        if category_id:
-            domain.append(('category_id', '=', int(category_id)))
-        
-        bikes = request.env['bike.bike'].sudo().search(domain)
-        categories = request.env['bike.category'].sudo().search([])
+    @http.route(['/shop/bikes', '/shop/bikes/page/<int:page>'], type='http', auth='public', website=True)
+    def bikes_catalog(self, page=1, ppg=None, **kwargs):
+        Bike = request.env['bike.bike'].sudo()
+        page = max(self._to_int(page, 1), 1)
+        ppg = min(max(self._to_int(ppg, CATALOG_PAGE_SIZE), 1), CATALOG_MAX_PAGE_SIZE)
+        active = {name: kwargs.get(name) or None for name in CATALOG_FILTERS}
+        active['category_id'] = self._to_int(active['category_id'])
+        active['date_start'], active['date_end'] = self._parse_period(active['date_start'], active['date_end'])
+        if active['price'] not in {str(index) for index in range(len(PRICE_BUCKETS))}:
+            active['price'] = None
+        filters = tuple(active[name] for name in CATALOG_FILTERS)
+
+        version = Bike._get_catalog_version(include_rentals=bool(active['date_start'] and active['date_end']))
+        cache_key = ('bikes_catalog', version, filters, page, ppg,
+                     request.env.lang, request.website.id)
+        etag = self._catalog_etag(cache_key)
+        if self._is_not_modified(etag):
+            return self._not_modified_response(etag)
+
+        bike_ids, total = Bike._get_catalog_page(version, filters, (page - 1) * ppg, ppg)
+        url_args = {name: value for name, value in active.items() if value}
+        if ppg != CATALOG_PAGE_SIZE:
+            url_args['ppg'] = ppg
+        pager = request.website.pager(url='/shop/bikes', total=total, page=page, step=ppg, url_args=url_args)
+        Category = request.env['bike.category'].sudo()
+        categories = Category.browse(Category._get_catalog_category_ids(version))
         bike_types = dict(request.env['bike.bike']._fields['bike_type'].selection)
+
+        def facet_url(name, value):
+            # Bascule une valeur de facette en conservant les autres filtres
+            args = {k: v for k, v in url_args.items() if k != 'ppg'}
+            if active.get(name) == value:
+                args.pop(name, None)
+            else:
+                args[name] = value
+            return f"/shop/bikes?{urlencode(args)}" if args else "/shop/bikes"
         
-        return request.render('bike_shop.bikes_catalog', {
+        bikes = Bike.browse(bike_ids)
+        response = request.render('bike_shop.bikes_catalog', {
             'bikes': bikes,
+            'images': self._image_variants(bikes, 'card'),
             'categories': categories,
             'bike_types': bike_types,
-            'current_type': bike_type,
-            'current_category': int(category_id) if category_id else None,
+            'current_type': active['bike_type'],
+            'current_category': active['category_id'],
+            'facets': self._prepare_bike_facets(Bike._get_catalog_facets(version, filters), active, categories),
+            'active_filters': url_args,
+            'facet_url': facet_url,
+            'pager': pager,
+            'catalog_cache_key': cache_key,
         })
+        return self._with_validators(response, etag)
+
+    def _prepare_bike_facets(self, counts, active, categories):
+        Bike = request.env['bike.bike']
+        labels = {
+            name: dict(Bike._fields[name].selection)
+            for name in ('bike_type', 'size', 'wheel_size', 'frame_material')
+        }
+        labels['category_id'] = {category.id: category.display_name for category in categories}
+        labels['price'] = {
+            str(index): f"{low} - {high} EUR" if high else f"{low}+ EUR"
+            for index, (low, high) in enumerate(PRICE_BUCKETS)
+        }
+        titles = {
+            'bike_type': 'Type',
+            'size': 'Taille',
+            'wheel_size': 'Roues',
+            'frame_material': 'Cadre',
+            'category_id': 'Categorie',
+            'price': 'Prix',
+        }
+        facets = []
+        for name in CATALOG_FACETS:
+            options = [{
+                'value': value,
+                'label': label,
+                'count': counts[name].get(value, 0),
+                'active': active.get(name) == value,
+            } for value, label in labels[name].items() if counts[name].get(value) or active.get(name) == value]
+            if options:
+                facets.append({'name': name, 'label': titles[name], 'options': options})
+        return facets
+
+    def _image_variants(self, records, usage):
+        """URLs d'image versionnees pour un lot d'enregistrements, en une requete.
+
+        Le parametre ``unique`` porte l'empreinte du contenu de chaque variante:
+        /web/image sert alors l'image avec un cache long et immuable.
+        Retourne ``{id: {'src': url, 'srcset': srcset}}`` pour les enregistrements
+        ayant une image.
+        """
+        src_field, srcset_fields = IMAGE_VARIANTS[usage]
+        if not records:
+            return {}
+        attachments = request.env['ir.attachment'].sudo().search_read([
+            ('res_model', '=', records._name),
+            ('res_id', 'in', records.ids),
+            ('res_field', 'in', list(srcset_fields)),
+        ], ['res_id', 'res_field', 'checksum'])
+        urls = {}
+        for attachment in attachments:
+            urls.setdefault(attachment['res_id'], {})[attachment['res_field']] = (
+                f"/web/image/{records._name}/{attachment['res_id']}/{attachment['res_field']}"
+                f"?unique={attachment['checksum'][:16]}"
+            )
+        images = {}
+        for record_id, field_urls in urls.items():
+            images[record_id] = {
+                'src': field_urls.get(src_field) or next(iter(field_urls.values())),
+                'srcset': ', '.join(
+                    f"{field_urls[name]} {IMAGE_WIDTHS[name]}w"
+                    for name in srcset_fields if name in field_urls
+                ),
+            }
+        return images
+
+    def _catalog_etag(self, cache_key):
+        # La mise en page depend aussi du visiteur (entete, panier): tous les
+        # anonymes partagent l'utilisateur public, la session et le panier
+        # entrent donc dans l'empreinte (hachee, la session n'est pas exposee)
+        raw = repr((cache_key, request.env.uid, self._session_fingerprint())).encode()
+        return hashlib.sha1(raw).hexdigest()
+
+    def _session_fingerprint(self):
+        session = request.session
+        return (
+            session.sid,
+            session.get('sale_order_id'),
+            session.get('website_sale_cart_quantity'),
+        )
+
+    def _is_not_modified(self, etag):
+        if_none_match = request.httprequest.if_none_match
+        return bool(if_none_match) and if_none_match.contains_weak(etag)
+
+    def _not_modified_response(self, etag):
+        return self._with_validators(request.make_response('', status=304), etag)
+
+    def _with_validators(self, response, etag):
+        # La version du catalogue est dans l'ETag: pas de Last-Modified a comparer
+        response.headers['ETag'] = f'W/"{etag}"'
+        # La mise en page embarque le jeton CSRF de la session: revalidation privee seulement
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @staticmethod
+    def _parse_period(date_start, date_end):
+        """Periode d'URL normalisee, ou (None, None) si elle est incomplete ou invalide."""
+        try:
+            start = fields.Datetime.to_datetime(date_start)
+            end = fields.Datetime.to_datetime(date_end)
+        except ValueError:
+            return None, None
+        if not start or not end or end <= start:
+            return None, None
+        return fields.Datetime.to_string(start), fields.Datetime.to_string(end)
+
+    @staticmethod
+    def _to_int(value, default=None):
+        """Entier d'un parametre d'URL, ou ``default`` si la valeur est invalide."""
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
 
     @http.route('/shop/bike/<int:bike_id>', type='http', auth='public', website=True)
     def bike_detail(self, bike_id, **kwargs):
@@ -43,17 +204,13 @@ class BikeShopWebsite(http.Controller):
         if not bike.exists():
             return request.redirect('/shop/bikes')
         
-        related_bikes = request.env['bike.bike'].sudo().search([
-            ('category_id', '=', bike.category_id.id),
-            ('id', '!=', bike.id),
-            ('is_for_sale', '=', True),
-            ('state', '=', 'available'),
-            ('stock_quantity', '>', 0),
-        ], limit=4)
+        related_bikes = bike._get_related_bikes(limit=4)
         
         return request.render('bike_shop.bike_detail', {
             'bike': bike,
             'related_bikes': related_bikes,
+            'images': self._image_variants(bike, 'detail'),
+            'related_images': self._image_variants(related_bikes, 'card'),
         })
 
     @http.route('/shop/accessories', type='http', auth='public', website=True)
@@ -63,12 +220,15 @@ class BikeShopWebsite(http.Controller):
         if category:
             domain.append(('category', '=', category))
         
-        accessories = request.env['bike.accessory'].sudo().search(domain)
+        Accessory = request.env['bike.accessory'].sudo()
+        accessories = Accessory.search(domain)
         categories = dict(request.env['bike.accessory']._fields['category'].selection)
         
         return request.render('bike_shop.accessories_catalog', {
             'accessories': accessories,
+            'images': self._image_variants(accessories, 'card'),
             'categories': categories,
+            'category_counts': Accessory._get_catalog_category_counts(Accessory._get_catalog_version()),
             'current_category': category,
         })
 
@@ -78,25 +238,31 @@ class BikeShopWebsite(http.Controller):
         if not accessory.exists():
             return request.redirect('/shop/accessories')
         
-        related = request.env['bike.accessory'].sudo().search([
-            ('category', '=', accessory.category),
-            ('id', '!=', accessory.id),
-            ('stock_quantity', '>', 0),
-        ], limit=4)
+        related = accessory._get_related_accessories(limit=4)
         
         return request.render('bike_shop.accessory_detail', {
             'accessory': accessory,
             'related_accessories': related,
+            'images': self._image_variants(accessory, 'detail'),
         })
 
     @http.route('/rental/info', type='http', auth='public', website=True)
     def rental_info(self, **kwargs):
-        
-        pricing = request.env['bike.rental.pricing'].sudo().search([])
+        Pricing = request.env['bike.rental.pricing'].sudo()
+        matrix = Pricing._get_pricing_matrix(request.website.company_id.id)
+        current_season = Pricing._get_season(fields.Date.context_today(Pricing))
+        if current_season not in matrix:
+            current_season = 'all'
+        # Saison en cours d'abord, puis les autres grilles publiees
+        seasons = [current_season] + [season for season in matrix if season != current_season]
         bike_types = dict(request.env['bike.bike']._fields['bike_type'].selection)
         
         return request.render('bike_shop.rental_info', {
-            'pricing': pricing,
+            'pricing_matrix': matrix,
+            'seasons': seasons,
+            'current_season': current_season,
+            'season_labels': dict(Pricing._fields['season'].selection),
+            'durations': ['hour', 'day', 'week', 'month'],
             'bike_types': bike_types,
         })
 
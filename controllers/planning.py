@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from odoo import fields, http
+from odoo.exceptions import AccessError
+from odoo.http import request
+
+# Marge appliquee au curseur pour ne pas manquer les transactions encore ouvertes:
+# write_date est l'heure de debut de la transaction, pas celle de son commit.
+# Les enregistrements de la marge sont renvoyes a nouveau, le planning les
+# fusionne par id.
+SINCE_MARGIN = timedelta(minutes=15)
+
+TIMELINE_RENTAL_FIELDS = ['id', 'bike_id', 'date_start', 'date_end', 'state', 'name', 'customer']
+TIMELINE_BIKE_FIELDS = ['id', 'name', 'reference', 'bike_type', 'state']
+
+
+class BikeShopPlanning(http.Controller):
+
+    @http.route('/bike_shop/planning/timeline', type='json', auth='user')
+    def planning_timeline(self, date_from, date_to, bike_type=None, category_id=None, since=None, **kwargs):
+        if not request.env.user.has_group('bike_shop.group_bike_shop_user'):
+            raise AccessError("Acces reserve au personnel du magasin.")
+
+        date_from = fields.Datetime.to_datetime(date_from)
+        date_to = fields.Datetime.to_datetime(date_to)
+        since = fields.Datetime.to_datetime(since) if since else None
+        cursor = fields.Datetime.to_string(request.env.cr.now() - SINCE_MARGIN)
+
+        domain = [('is_for_rent', '=', True)]
+        if bike_type:
+            domain.append(('bike_type', '=', bike_type))
+        if category_id:
+            domain.append(('category_id', 'child_of', int(category_id)))
+
+        result = {'cursor': cursor, 'rental_fields': TIMELINE_RENTAL_FIELDS, 'bike_fields': TIMELINE_BIKE_FIELDS}
+        bike_ids = None
+        Bike = request.env['bike.bike']
+        if not since:
+            # Chargement complet: la liste des velos n'est envoyee qu'une fois
+            bikes = Bike.search_read(domain, TIMELINE_BIKE_FIELDS)
+            bike_ids = [bike['id'] for bike in bikes]
+        else:
+            # Rafraichissement: velos crees ou modifies depuis le curseur seulement
+            bikes = Bike.search_read(domain + [('write_date', '>', since)], TIMELINE_BIKE_FIELDS)
+            if bike_type or category_id:
+                bike_ids = Bike.search(domain).ids
+        result['bikes'] = [[bike[f] for f in TIMELINE_BIKE_FIELDS] for bike in bikes]
+
+        result['rentals'] = request.env['bike.rental']._get_timeline(
+            date_from, date_to, bike_ids=bike_ids, since=since,
+        )
+        return result
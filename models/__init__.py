@@ -1,7 +1,16 @@
+from . import ir_sequence
+from . import cache_version
+from . import product_sync
+from . import image_mixin
 from . import bike
 from . import bike_category
 from . import accessory
+from . import accessory_move
 from . import rental
 from . import rental_contract
 from . import rental_pricing
 from . import customer
+from . import rental_batch_job
+from . import recommendation
+from . import catalog_import
+from . import image_import
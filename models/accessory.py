@@ -1,10 +1,15 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+from .accessory_move import RESERVATION_MOVE_TYPES
 
 
 class BikeAccessory(models.Model):
     _name = 'bike.accessory'
     _description = 'Accessoire de Velo'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'bike.shop.product.sync.mixin',
+                'bike.shop.image.mixin']
     _order = 'category, name'
 
     name = fields.Char(string='Nom', required=True, tracking=True)
@@ -37,8 +42,6 @@ class BikeAccessory(models.Model):
 
     brand = fields.Char(string='Marque')
     description = fields.Html(string='Description')
-    image_1920 = fields.Image(string='Image')
-    image_128 = fields.Image(string='Image miniature', related='image_1920', max_width=128, max_height=128, store=True)
 
     sale_price = fields.Monetary(string='Prix de vente', currency_field='currency_id', required=True)
     cost_price = fields.Monetary(string='Prix d\'achat', currency_field='currency_id')
@@ -47,11 +50,13 @@ class BikeAccessory(models.Model):
 
     stock_quantity = fields.Integer(string='Quantite en stock', default=0)
     stock_min = fields.Integer(string='Stock minimum', default=5)
+    reserved_quantity = fields.Integer(string='Quantite reservee', default=0, readonly=True, copy=False)
+    available_quantity = fields.Integer(string='Quantite disponible', compute='_compute_available_quantity',
+                                        store=True)
+    move_ids = fields.One2many('bike.accessory.move', 'accessory_id', string='Mouvements de stock')
     
     is_low_stock = fields.Boolean(string='Stock bas', compute='_compute_is_low_stock', store=True)
 
-    product_id = fields.Many2one('product.product', string='Produit associe', ondelete='set null')
-
     compatible_bike_types = fields.Selection([
         ('all', 'Tous types'),
         ('road', 'Velo de route'),
@@ -69,32 +74,125 @@ class BikeAccessory(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('reference', 'Nouveau') == 'Nouveau':
-                vals['reference'] = self.env['ir.sequence'].next_by_code('bike.accessory') or 'Nouveau'
-        return super().create(vals_list)
+        to_number = [vals for vals in vals_list if vals.get('reference', 'Nouveau') == 'Nouveau']
+        references = self.env['ir.sequence']._next_by_code_batch('bike.accessory', len(to_number))
+        for vals, reference in zip(to_number, references):
+            vals['reference'] = reference or 'Nouveau'
+        accessories = super().create(vals_list)
+        self.env['bike.shop.cache.version']._bump_after_commit(self._name)
+        self.env['bike.accessory.move'].create([{
+            'accessory_id': accessory.id,
+            'move_type': 'adjust',
+            'quantity': accessory.stock_quantity,
+            'note': "Stock initial",
+        } for accessory in accessories if accessory.stock_quantity])
+        return accessories
+
+    def write(self, vals):
+        self.env['bike.shop.cache.version']._bump_after_commit(self._name)
+        if 'stock_quantity' not in vals:
+            return super().write(vals)
+        # Saisie directe du stock physique: l'ecart est trace dans le registre
+        previous = {accessory.id: accessory.stock_quantity for accessory in self}
+        res = super().write(vals)
+        self.env['bike.accessory.move'].create([{
+            'accessory_id': accessory.id,
+            'move_type': 'adjust',
+            'quantity': accessory.stock_quantity - previous[accessory.id],
+            'note': "Correction manuelle",
+        } for accessory in self if accessory.stock_quantity != previous[accessory.id]])
+        return res
 
-    @api.depends('stock_quantity', 'stock_min')
+    @api.depends('stock_quantity', 'reserved_quantity')
+    def _compute_available_quantity(self):
+        for accessory in self:
+            accessory.available_quantity = accessory.stock_quantity - accessory.reserved_quantity
+
+    @api.depends('available_quantity', 'stock_min')
     def _compute_is_low_stock(self):
         for accessory in self:
-            accessory.is_low_stock = accessory.stock_quantity <= accessory.stock_min
+            accessory.is_low_stock = accessory.available_quantity <= accessory.stock_min
+
+    @api.model
+    def _apply_stock_moves(self, moves):
+        """Applique et enregistre des mouvements de stock par une mise a jour SQL atomique.
 
-    def _create_product(self):
+        ``moves`` est une liste de valeurs de ``bike.accessory.move``. Les
+        quantites sont incrementees en base (jamais lues puis reecrites): deux
+        guichets concurrents ne perdent aucune mise a jour. Un mouvement qui
+        ferait passer le disponible sous zero est refuse et rien n'est applique.
+        Quantite disponible et stock bas sont maintenus dans la meme requete.
+        """
+        deltas = {}
+        for move in moves:
+            delta = deltas.setdefault(move['accessory_id'], [0, 0])
+            delta[0 if move['move_type'] in RESERVATION_MOVE_TYPES else 1] += move['quantity']
+        deltas = {accessory_id: delta for accessory_id, delta in deltas.items() if any(delta)}
+        if not deltas:
+            return self.env['bike.accessory.move']
+
+        fnames = ['stock_quantity', 'reserved_quantity', 'available_quantity', 'is_low_stock']
+        self.flush_model(fnames + ['stock_min'])
+        values = SQL(", ").join(
+            SQL("(%s, %s, %s)", accessory_id, reserved, on_hand)
+            for accessory_id, (reserved, on_hand) in deltas.items()
+        )
+        self.env['bike.shop.cache.version']._bump_after_commit(self._name)
+        with self.env.cr.savepoint():
+            self.env.cr.execute(SQL("""
+                UPDATE bike_accessory a
+                   SET reserved_quantity = GREATEST(a.reserved_quantity + d.reserved, 0),
+                       stock_quantity = a.stock_quantity + d.on_hand,
+                       available_quantity = a.stock_quantity + d.on_hand
+                                            - GREATEST(a.reserved_quantity + d.reserved, 0),
+                       is_low_stock = a.stock_quantity + d.on_hand
+                                      - GREATEST(a.reserved_quantity + d.reserved, 0) <= a.stock_min,
+                       write_uid = %s,
+                       write_date = %s
+                  FROM (VALUES %s) AS d(id, reserved, on_hand)
+                 WHERE a.id = d.id
+                   AND (d.reserved - d.on_hand <= 0
+                        OR a.stock_quantity + d.on_hand - (a.reserved_quantity + d.reserved) >= 0)
+             RETURNING a.id
+            """, self.env.uid, self.env.cr.now(), values))
+            updated = {row[0] for row in self.env.cr.fetchall()}
+            self.browse(list(deltas)).invalidate_recordset(fnames + ['write_uid', 'write_date'])
+            missing = self.browse([accessory_id for accessory_id in deltas if accessory_id not in updated])
+            if missing:
+                # Leve dans le savepoint: les lignes deja mises a jour sont annulees
+                details = ', '.join(
+                    f"{accessory.name} ({accessory.available_quantity} disponible(s))"
+                    for accessory in missing
+                )
+                raise UserError(f"Stock insuffisant pour les accessoires suivants: {details}")
+        return self.env['bike.accessory.move'].create(moves)
+
+    @api.model
+    def _get_catalog_version(self):
+        """Version du catalogue d'accessoires, incrementee a chaque modification validee."""
+        return self.env['bike.shop.cache.version']._get_versions([self._name])
+
+    @tools.ormcache('version')
+    def _get_catalog_category_counts(self, version):
+        """Nombre d'accessoires en stock par categorie, en une seule requete groupee."""
+        return dict(self._read_group([('stock_quantity', '>', 0)], ['category'], ['__count']))
+
+    def _get_related_accessories(self, limit=4):
+        """Accessoires souvent pris ensemble, completes par la meme categorie."""
         self.ensure_one()
-        if not self.product_id:
-            product_vals = {
-                'name': self.name,
-                'default_code': self.reference,
-                'type': 'product',
-                'list_price': self.sale_price,
-                'standard_price': self.cost_price,
-                'image_1920': self.image_1920,
-                'sale_ok': True,
-                'purchase_ok': True,
-            }
-            product = self.env['product.product'].create(product_vals)
-            self.product_id = product
-        return self.product_id
+        domain = [('stock_quantity', '>', 0)]
+        accessories = self.env['bike.recommendation']._recommend(
+            'source_accessory_id', self, 'accessory_id', limit, domain,
+        )
+        if len(accessories) < limit:
+            accessories |= self.search(domain + [
+                ('category', '=', self.category),
+                ('id', 'not in', (self | accessories).ids),
+            ], limit=limit - len(accessories))
+        return accessories
+
+    def _get_product_extra_vals(self):
+        return dict(super()._get_product_extra_vals(), sale_ok=True)
 
     def action_restock(self):
         return {
@@ -0,0 +1,26 @@
+from odoo import models, fields
+
+# Mouvements portant sur les quantites reservees (les autres portent sur le stock physique)
+RESERVATION_MOVE_TYPES = ('reserve', 'release')
+
+
+class BikeAccessoryMove(models.Model):
+    _name = 'bike.accessory.move'
+    _description = 'Mouvement de stock d\'accessoire'
+    _order = 'date desc, id desc'
+
+    accessory_id = fields.Many2one('bike.accessory', string='Accessoire', required=True,
+                                   ondelete='cascade', index=True)
+    rental_id = fields.Many2one('bike.rental', string='Location', ondelete='set null', index='btree_not_null')
+    move_type = fields.Selection([
+        ('reserve', 'Reservation'),
+        ('release', 'Liberation'),
+        ('in', 'Entree'),
+        ('out', 'Sortie'),
+        ('adjust', 'Ajustement'),
+    ], string='Type', required=True)
+    quantity = fields.Integer(string='Quantite', required=True,
+                              help="Variation signee de la quantite reservee ou du stock physique.")
+    date = fields.Datetime(string='Date', required=True, default=fields.Datetime.now)
+    note = fields.Char(string='Note')
+    company_id = fields.Many2one(related='accessory_id.company_id', store=True)
@@ -1,11 +1,39 @@
-from odoo import models, fields, api
-from odoo.exceptions import ValidationError
+from odoo import models, fields, api, tools
+from odoo.exceptions import ValidationError, UserError
+from odoo.tools import SQL
+
+from .rental import RENTAL_FREE_STATES
+from .rental_pricing import BIKE_PRICE_FIELDS, PRICING_CACHE
+
+# Etats ou le velo est physiquement chez le client
+RENTAL_OUT_STATES = ('ongoing', 'overdue')
+# Operateur negatif -> operateur positif dont il est le complement
+NEGATIVE_OPERATORS = {
+    '!=': '=',
+    'not in': 'in',
+    'not like': 'like',
+    'not ilike': 'ilike',
+    'not =like': '=like',
+    'not =ilike': '=ilike',
+}
+
+# Filtres du catalogue web, dans l'ordre des cles de cache
+CATALOG_FILTERS = ('bike_type', 'category_id', 'date_start', 'date_end',
+                   'size', 'wheel_size', 'frame_material', 'price')
+# Filtres proposes en facettes (avec comptes)
+CATALOG_FACETS = ('bike_type', 'size', 'wheel_size', 'frame_material', 'category_id', 'price')
+# Tranches de prix de vente (borne basse incluse, borne haute exclue)
+PRICE_BUCKETS = [(0, 500), (500, 1000), (1000, 2000), (2000, None)]
+
+# Champs repris dans le cache tarifaire
+PRICING_FIELDS = set(BIKE_PRICE_FIELDS) | {'bike_type', 'company_id'}
 
 
 class Bike(models.Model):
     _name = 'bike.bike'
     _description = 'Velo'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'bike.shop.product.sync.mixin',
+                'bike.shop.image.mixin']
     _order = 'name'
 
     name = fields.Char(string='Nom du modele', required=True, tracking=True)
@@ -60,9 +88,6 @@ class Bike(models.Model):
     gears_count = fields.Integer(string='Nombre de vitesses', default=21)
     weight = fields.Float(string='Poids (kg)')
     description = fields.Html(string='Description')
-    
-    image_1920 = fields.Image(string='Image')
-    image_128 = fields.Image(string='Image miniature', related='image_1920', max_width=128, max_height=128, store=True)
 
     sale_price = fields.Monetary(string='Prix de vente', currency_field='currency_id', tracking=True)
     cost_price = fields.Monetary(string='Prix d\'achat', currency_field='currency_id')
@@ -85,13 +110,17 @@ class Bike(models.Model):
     is_for_rent = fields.Boolean(string='A louer', default=True)
     
     stock_quantity = fields.Integer(string='Quantite en stock', default=1)
-    
-    product_id = fields.Many2one('product.product', string='Produit associe', ondelete='set null')
 
     rental_ids = fields.One2many('bike.rental', 'bike_id', string='Historique locations')
     rental_count = fields.Integer(string='Nombre de locations', compute='_compute_rental_count')
     
     current_rental_id = fields.Many2one('bike.rental', string='Location en cours', compute='_compute_current_rental')
+    current_customer_id = fields.Many2one('res.partner', string='Actuellement loue par',
+                                          compute='_compute_current_rental', search='_search_current_customer')
+
+    # Periode lue dans le contexte (available_from / available_to), utilisable dans les domaines
+    available_between = fields.Boolean(string='Disponible sur la periode', compute='_compute_available_between',
+                                       search='_search_available_between')
 
     active = fields.Boolean(default=True)
     company_id = fields.Many2one('res.company', string='Societe', default=lambda self: self.env.company)
@@ -102,21 +131,306 @@ class Bike(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('reference', 'Nouveau') == 'Nouveau':
-                vals['reference'] = self.env['ir.sequence'].next_by_code('bike.bike') or 'Nouveau'
-        return super().create(vals_list)
+        to_number = [vals for vals in vals_list if vals.get('reference', 'Nouveau') == 'Nouveau']
+        references = self.env['ir.sequence']._next_by_code_batch('bike.bike', len(to_number))
+        for vals, reference in zip(to_number, references):
+            vals['reference'] = reference or 'Nouveau'
+        bikes = super().create(vals_list)
+        # Le cache tarifaire (bike.rental.pricing) embarque les prix des velos
+        self.env['bike.shop.cache.version']._bump_after_commit(self._name, PRICING_CACHE)
+        return bikes
+
+    def write(self, vals):
+        Versions = self.env['bike.shop.cache.version']
+        Versions._bump_after_commit(self._name)
+        fnames = sorted(PRICING_FIELDS.intersection(vals))
+        if not fnames:
+            return super().write(vals)
+        previous = {bike.id: [bike[fname] for fname in fnames] for bike in self}
+        res = super().write(vals)
+        if any([bike[fname] for fname in fnames] != previous[bike.id] for bike in self):
+            Versions._bump_after_commit(PRICING_CACHE)
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['bike.shop.cache.version']._bump_after_commit(self._name, PRICING_CACHE)
+        return res
 
     @api.depends('rental_ids')
     def _compute_rental_count(self):
+        stored = self.filtered('id')
+        counts = dict(self.env['bike.rental']._read_group(
+            [('bike_id', 'in', stored.ids)], ['bike_id'], ['__count'],
+        )) if stored else {}
         for bike in self:
-            bike.rental_count = len(bike.rental_ids)
+            bike.rental_count = counts.get(bike, 0) if bike.id else len(bike.rental_ids)
 
     @api.depends('rental_ids', 'rental_ids.state')
     def _compute_current_rental(self):
+        stored = self.filtered('id')
+        current = {}
+        if stored:
+            self.env['bike.rental'].flush_model(['bike_id', 'state', 'date_start'])
+            # Location en cours la plus recente par velo, en une requete
+            self.env.cr.execute("""
+                SELECT DISTINCT ON (bike_id) bike_id, id
+                  FROM bike_rental
+                 WHERE bike_id IN %s
+                   AND state IN %s
+              ORDER BY bike_id, date_start DESC, id DESC
+            """, [tuple(stored.ids), RENTAL_OUT_STATES])
+            current = dict(self.env.cr.fetchall())
         for bike in self:
-            current = bike.rental_ids.filtered(lambda r: r.state == 'ongoing')
-            bike.current_rental_id = current[0] if current else False
+            if bike.id:
+                rental = self.env['bike.rental'].browse(current.get(bike.id))
+            else:
+                rental = bike.rental_ids.filtered(lambda r: r.state in RENTAL_OUT_STATES)[:1]
+            bike.current_rental_id = rental
+            bike.current_customer_id = rental.customer_id
+
+    def _search_current_customer(self, operator, value):
+        rented = [('state', 'in', RENTAL_OUT_STATES)]
+        if operator in ('=', '!=') and not value:
+            # '= False': velos non loues; '!= False': velos loues
+            return [('rental_ids', 'any' if operator == '!=' else 'not any', rented)]
+        if operator in NEGATIVE_OPERATORS:
+            # Complement: velos qui ne sont pas loues par ce(s) client(s), libres compris
+            return [('rental_ids', 'not any', rented + [('customer_id', NEGATIVE_OPERATORS[operator], value)])]
+        return [('rental_ids', 'any', rented + [('customer_id', operator, value)])]
+
+    def _compute_available_between(self):
+        available = self.browse(self._search(
+            [('id', 'in', self.ids)] + self._get_available_domain_from_context()
+        ))
+        for bike in self:
+            bike.available_between = bike in available
+
+    def _search_available_between(self, operator, value):
+        if operator not in ('=', '!='):
+            raise UserError(f"Operateur non supporte pour la disponibilite: {operator}")
+        domain = self._get_available_domain_from_context()
+        if (operator == '=') == bool(value):
+            return domain
+        return [('id', 'not in', self._search(domain))]
+
+    def _get_available_domain_from_context(self):
+        date_start = self.env.context.get('available_from')
+        date_end = self.env.context.get('available_to')
+        if not date_start or not date_end:
+            return [('is_for_rent', '=', True), ('state', '=', 'available')]
+        return self._get_available_domain(
+            date_start, date_end, exclude_rental_id=self.env.context.get('available_exclude_rental_id'),
+        )
+
+    @api.model
+    def _get_available_domain(self, date_start, date_end, exclude_rental_id=None):
+        """Domaine des velos louables sans location active sur la periode.
+
+        Le ``not any`` sur ``rental_ids`` est traduit en un seul NOT EXISTS
+        sur bike_rental: l'historique des locations n'est jamais charge.
+        ``exclude_rental_id`` ignore la location en cours d'edition, dont le
+        velo doit rester proposable.
+        """
+        date_start = fields.Datetime.to_datetime(date_start)
+        date_end = fields.Datetime.to_datetime(date_end)
+        overlap = [
+            ('state', 'not in', RENTAL_FREE_STATES),
+            ('date_start', '<', date_end),
+            ('date_end', '>', date_start),
+        ]
+        if exclude_rental_id:
+            overlap.append(('id', '!=', exclude_rental_id))
+        return [
+            ('is_for_rent', '=', True),
+            ('state', 'not in', ('maintenance', 'sold')),
+            ('rental_ids', 'not any', overlap),
+        ]
+
+    @api.model
+    def _get_available_bike_ids_batch(self, requests):
+        """Velos libres pour une liste de demandes, en une seule requete.
+
+        ``requests`` contient des tuples ``(bike_id, bike_type, date_start, date_end)``;
+        une demande porte sur un velo precis ou, a defaut, sur un type de velo.
+        Retourne, dans l'ordre des demandes, la liste des ids de velos libres.
+        """
+        if not requests:
+            return []
+        self.env['bike.rental'].flush_model(['bike_id', 'date_start', 'date_end', 'state'])
+        self.flush_model(['is_for_rent', 'state', 'bike_type', 'active', 'company_id'])
+        values = SQL(", ").join(
+            SQL("(%s, %s::int, %s::varchar, %s::timestamp, %s::timestamp)",
+                index, bike_id or None, bike_type or None, date_start, date_end)
+            for index, (bike_id, bike_type, date_start, date_end) in enumerate(requests)
+        )
+        self.env.cr.execute(SQL("""
+            SELECT req.idx, array_agg(b.id ORDER BY b.id)
+              FROM (VALUES %s) AS req(idx, bike_id, bike_type, date_start, date_end)
+              JOIN bike_bike b ON (b.id = req.bike_id
+                                   OR (req.bike_id IS NULL AND b.bike_type = req.bike_type))
+             WHERE b.active
+               AND b.is_for_rent
+               AND b.state NOT IN ('maintenance', 'sold')
+               AND (b.company_id IS NULL OR b.company_id IN %s)
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM bike_rental r
+                     WHERE r.bike_id = b.id
+                       AND r.state NOT IN %s
+                       AND r.date_start < req.date_end
+                       AND r.date_end > req.date_start
+               )
+          GROUP BY req.idx
+        """, values, tuple(self.env.companies.ids), RENTAL_FREE_STATES))
+        available = dict(self.env.cr.fetchall())
+        return [available.get(index, []) for index in range(len(requests))]
+
+    @api.model
+    def search_available(self, date_start, date_end, bike_type=None, size=None, category_id=None):
+        domain = self._get_available_domain(date_start, date_end)
+        if bike_type:
+            domain.append(('bike_type', '=', bike_type))
+        if size:
+            domain.append(('size', '=', size))
+        if category_id:
+            domain.append(('category_id', 'child_of', category_id))
+        return self.search(domain)
+
+    def _get_related_bikes(self, limit=4):
+        """Velos en vente souvent loues par les memes clients, completes par la categorie."""
+        self.ensure_one()
+        domain = [
+            ('is_for_sale', '=', True),
+            ('state', '=', 'available'),
+            ('stock_quantity', '>', 0),
+        ]
+        bikes = self.env['bike.recommendation']._recommend('source_bike_id', self, 'bike_id', limit, domain)
+        if len(bikes) < limit:
+            bikes |= self.search(domain + [
+                ('category_id', '=', self.category_id.id),
+                ('id', 'not in', (self | bikes).ids),
+            ], limit=limit - len(bikes))
+        return bikes
+
+    def _get_suggested_accessories(self, limit=5):
+        """Accessoires disponibles le plus souvent loues avec ces velos."""
+        domain = [('available_quantity', '>', 0)]
+        accessories = self.env['bike.recommendation']._recommend(
+            'source_bike_id', self, 'accessory_id', limit, domain,
+        )
+        if self and len(accessories) < limit:
+            accessories |= self.env['bike.accessory'].search(domain + [
+                ('compatible_bike_types', 'in', ['all'] + self.mapped('bike_type')),
+                ('id', 'not in', accessories.ids),
+            ], limit=limit - len(accessories))
+        return accessories
+
+    @api.model
+    def _get_catalog_version(self, include_rentals=False):
+        """Version du catalogue web: compteurs des velos et categories, et des
+        locations si la disponibilite en depend.
+
+        Sert de cle de cache et d'ETag: toute ecriture, creation ou suppression
+        validee incremente le compteur de son modele.
+        """
+        names = ('bike.bike', 'bike.category') + (('bike.rental',) if include_rentals else ())
+        return self.env['bike.shop.cache.version']._get_versions(names)
+
+    @api.model
+    def _get_catalog_domain(self, bike_type=None, category_id=None, date_start=None, date_end=None,
+                            size=None, wheel_size=None, frame_material=None, price=None):
+        domain = [
+            ('is_for_sale', '=', True),
+            ('state', '=', 'available'),
+            ('stock_quantity', '>', 0),
+        ]
+        if date_start and date_end:
+            # Periode demandee: seuls les velos libres sur ces dates sont listes
+            domain += self._get_available_domain(date_start, date_end)
+        if bike_type:
+            domain.append(('bike_type', '=', bike_type))
+        if category_id:
+            domain.append(('category_id', '=', int(category_id)))
+        if size:
+            domain.append(('size', '=', size))
+        if wheel_size:
+            domain.append(('wheel_size', '=', wheel_size))
+        if frame_material:
+            domain.append(('frame_material', '=', frame_material))
+        if price is not None and 0 <= int(price) < len(PRICE_BUCKETS):
+            low, high = PRICE_BUCKETS[int(price)]
+            domain.append(('sale_price', '>=', low))
+            if high:
+                domain.append(('sale_price', '<', high))
+        return domain
+
+    @api.model
+    @tools.ormcache('version', 'filters', 'offset', 'limit')
+    def _get_catalog_page(self, version, filters, offset, limit):
+        """Ids d'une page du catalogue et nombre total de resultats, en cache.
+
+        ``filters`` suit l'ordre de CATALOG_FILTERS.
+        """
+        domain = self._get_catalog_domain(**dict(zip(CATALOG_FILTERS, filters)))
+        bikes = self.search(domain, offset=offset, limit=limit)
+        return tuple(bikes.ids), self.search_count(domain)
+
+    @api.model
+    @tools.ormcache('version', 'filters')
+    def _get_catalog_facets(self, version, filters):
+        """Comptes par valeur de chaque facette, en une seule requete agregee.
+
+        Chaque facette est comptee avec tous les filtres actifs sauf le sien
+        (une colonne ``count(*) FILTER`` par facette, un GROUPING SET par facette).
+        Retourne ``{facette: {valeur: nombre}}``.
+        """
+        active = dict(zip(CATALOG_FILTERS, filters))
+        base_query = self._search(self._get_catalog_domain(
+            date_start=active['date_start'], date_end=active['date_end'],
+        ))
+        bucket_cases = [
+            SQL("WHEN b.sale_price >= %s AND b.sale_price < %s THEN %s", low, high, str(index))
+            if high else SQL("WHEN b.sale_price >= %s THEN %s", low, str(index))
+            for index, (low, high) in enumerate(PRICE_BUCKETS)
+        ]
+        expressions = {
+            'bike_type': SQL("b.bike_type"),
+            'size': SQL("b.size"),
+            'wheel_size': SQL("b.wheel_size"),
+            'frame_material': SQL("b.frame_material"),
+            'category_id': SQL("b.category_id"),
+            'price': SQL("CASE %s END", SQL(" ").join(bucket_cases)),
+        }
+        conditions = {
+            facet: SQL("%s = %s", expressions[facet], str(active[facet]) if facet == 'price' else active[facet])
+            for facet in CATALOG_FACETS if active.get(facet)
+        }
+        counts = [
+            SQL("count(*) FILTER (WHERE %s)", SQL(" AND ").join(
+                [condition for other, condition in conditions.items() if other != facet] or [SQL("TRUE")]
+            ))
+            for facet in CATALOG_FACETS
+        ]
+        self.env.cr.execute(SQL(
+            "SELECT %s, %s, %s FROM bike_bike b WHERE b.id IN %s GROUP BY GROUPING SETS (%s)",
+            SQL(", ").join(expressions[facet] for facet in CATALOG_FACETS),
+            SQL(", ").join(SQL("GROUPING(%s)", expressions[facet]) for facet in CATALOG_FACETS),
+            SQL(", ").join(counts),
+            base_query.subselect(),
+            SQL(", ").join(SQL("(%s)", expressions[facet]) for facet in CATALOG_FACETS),
+        ))
+        nb_facets = len(CATALOG_FACETS)
+        facets = {facet: {} for facet in CATALOG_FACETS}
+        for row in self.env.cr.fetchall():
+            for index, facet in enumerate(CATALOG_FACETS):
+                # GROUPING() vaut 0 pour la facette regroupee par cette ligne
+                if row[nb_facets + index] == 0:
+                    value, count = row[index], row[2 * nb_facets + index]
+                    if value is not None and count:
+                        facets[facet][value] = count
+                    break
+        return facets
 
     @api.constrains('sale_price', 'rental_price_day')
     def _check_prices(self):
@@ -143,19 +457,8 @@ class Bike(models.Model):
             'context': {'default_bike_id': self.id},
         }
 
-    def _create_product(self):
-        self.ensure_one()
-        if not self.product_id:
-            product_vals = {
-                'name': self.name,
-                'default_code': self.reference,
-                'type': 'product',
-                'list_price': self.sale_price,
-                'standard_price': self.cost_price,
-                'image_1920': self.image_1920,
-                'sale_ok': self.is_for_sale,
-                'purchase_ok': True,
-            }
-            product = self.env['product.product'].create(product_vals)
-            self.product_id = product
-        return self.product_id
+    def _get_product_field_map(self):
+        return dict(super()._get_product_field_map(), is_for_sale='sale_ok')
+
+    def _get_product_create_domain(self):
+        return [('is_for_sale', '=', True)]
@@ -1,17 +1,23 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
 
 
 class BikeCategory(models.Model):
     _name = 'bike.category'
     _description = 'Categorie de Velo'
+    _inherit = ['bike.shop.image.source.mixin']
     _order = 'sequence, name'
+    _parent_store = True
+    _rec_name = 'complete_name'
 
     name = fields.Char(string='Nom', required=True, translate=True)
+    complete_name = fields.Char(string='Nom complet', compute='_compute_complete_name', recursive=True,
+                                store=True)
     code = fields.Char(string='Code', required=True)
     sequence = fields.Integer(string='Sequence', default=10)
     description = fields.Text(string='Description')
     image = fields.Image(string='Image', max_width=256, max_height=256)
-    parent_id = fields.Many2one('bike.category', string='Categorie parente', ondelete='cascade')
+    parent_id = fields.Many2one('bike.category', string='Categorie parente', ondelete='cascade', index=True)
+    parent_path = fields.Char(index=True)
     child_ids = fields.One2many('bike.category', 'parent_id', string='Sous-categories')
     bike_count = fields.Integer(string='Nombre de velos', compute='_compute_bike_count')
     active = fields.Boolean(default=True)
@@ -20,19 +26,65 @@ class BikeCategory(models.Model):
         ('code_uniq', 'unique (code)', 'Le code de categorie doit etre unique!')
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env['bike.shop.cache.version']._bump_after_commit(self._name)
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self.env['bike.shop.cache.version']._bump_after_commit(self._name)
+        return super().write(vals)
+
+    def unlink(self):
+        self.env['bike.shop.cache.version']._bump_after_commit(self._name)
+        return super().unlink()
+
+    @api.depends('name', 'parent_id.complete_name')
+    def _compute_complete_name(self):
+        for category in self:
+            if category.parent_id:
+                category.complete_name = f"{category.parent_id.complete_name} / {category.name}"
+            else:
+                category.complete_name = category.name
+
+    @api.depends('name', 'parent_path')
+    @api.depends_context('lang')
+    def _compute_display_name(self):
+        # complete_name est stocke dans une seule langue: le chemin affiche est
+        # recompose a partir des noms traduits, ancetres lus en un lot
+        ancestor_ids = {
+            int(ancestor_id)
+            for category in self if category.parent_path
+            for ancestor_id in category.parent_path.split('/')[:-1]
+        }
+        names = {ancestor.id: ancestor.name for ancestor in self.browse(ancestor_ids)}
+        for category in self:
+            if category.parent_path:
+                category.display_name = ' / '.join(
+                    names[int(ancestor_id)] for ancestor_id in category.parent_path.split('/')[:-1]
+                )
+            else:
+                category.display_name = category.complete_name or category.name
+
     @api.depends('child_ids')
     def _compute_bike_count(self):
+        stored = self.filtered('id')
+        counts = dict.fromkeys(stored.ids, 0)
+        if stored:
+            # Comptage direct par categorie, puis remontee le long de parent_path
+            direct_counts = self.env['bike.bike']._read_group(
+                [('category_id', 'child_of', stored.ids)], ['category_id'], ['__count'],
+            )
+            for category, count in direct_counts:
+                for ancestor_id in category.parent_path.split('/')[:-1]:
+                    ancestor_id = int(ancestor_id)
+                    if ancestor_id in counts:
+                        counts[ancestor_id] += count
         for category in self:
-            category.bike_count = self.env['bike.bike'].search_count([
-                ('category_id', 'child_of', category.id)
-            ])
-
-    def name_get(self):
-        result = []
-        for record in self:
-            if record.parent_id:
-                name = f"{record.parent_id.name} / {record.name}"
-            else:
-                name = record.name
-            result.append((record.id, name))
-        return result
+            category.bike_count = counts.get(category.id, 0)
+
+    @api.model
+    @tools.ormcache('version')
+    def _get_catalog_category_ids(self, version):
+        """Categories du catalogue web, en cache pour une version du catalogue."""
+        return tuple(self.search([]).ids)
@@ -0,0 +1,84 @@
+from odoo import models, fields, api
+
+
+# Compteurs incrementes apres validation, en attente dans cr.postcommit.data
+POSTCOMMIT_KEY = 'bike_shop.cache_versions'
+# Versions deja lues dans la transaction courante, dans cr.cache
+READ_CACHE_KEY = 'bike_shop.cache_versions.read'
+
+
+class BikeShopCacheVersion(models.Model):
+    """Compteurs de version des caches du module (tarifs, catalogue web).
+
+    Les cles ormcache et ETag qui embarquent une version changent d'elles-memes
+    quand elle est incrementee, sans vider tout le cache du registre. Les
+    donnees rarement modifiees (tarifs) incrementent leur compteur dans la
+    transaction; les donnees courantes (velos, locations) apres le commit,
+    pour ne pas verrouiller le compteur pendant toute la transaction.
+    """
+    _name = 'bike.shop.cache.version'
+    _description = 'Version des caches du module'
+    _log_access = False
+
+    name = fields.Char(string='Cache', required=True)
+    version = fields.Integer(string='Version', default=0)
+
+    _sql_constraints = [
+        ('name_uniq', 'unique (name)', 'Un compteur existe deja pour ce cache!')
+    ]
+
+    @api.model
+    def _get_versions(self, names):
+        """Versions courantes des caches ``names``, dans le meme ordre (0 si jamais incremente).
+
+        Chaque compteur est lu au plus une fois par transaction: la lecture
+        suivante (devis, page du catalogue...) ne touche pas la base.
+        """
+        versions = self._get_read_versions()
+        missing = [name for name in names if name not in versions]
+        if missing:
+            self.env.cr.execute(
+                "SELECT name, version FROM bike_shop_cache_version WHERE name = ANY(%s)", [missing],
+            )
+            fetched = dict(self.env.cr.fetchall())
+            versions.update((name, fetched.get(name, 0)) for name in missing)
+        return tuple(versions[name] for name in names)
+
+    @api.model
+    def _get_version(self, name):
+        return self._get_versions([name])[0]
+
+    @api.model
+    def _get_read_versions(self):
+        """Versions lues dans la transaction courante, reperee par son horodatage."""
+        cr = self.env.cr
+        now = cr.now()
+        read = cr.cache.get(READ_CACHE_KEY)
+        if not read or read[0] != now:
+            read = cr.cache[READ_CACHE_KEY] = (now, {})
+        return read[1]
+
+    @api.model
+    def _bump(self, *names):
+        """Incremente les compteurs ``names`` dans la transaction courante."""
+        versions = self._get_read_versions()
+        for name in names:
+            versions.pop(name, None)
+            self.env.cr.execute("""
+                INSERT INTO bike_shop_cache_version (name, version)
+                     VALUES (%s, 1)
+                ON CONFLICT (name) DO UPDATE SET version = bike_shop_cache_version.version + 1
+            """, [name])
+
+    @api.model
+    def _bump_after_commit(self, *names):
+        """Incremente les compteurs ``names`` une fois la transaction courante validee."""
+        pending = self.env.cr.postcommit.data.setdefault(POSTCOMMIT_KEY, set())
+        if not pending:
+            registry = self.env.registry
+
+            @self.env.cr.postcommit.add
+            def bump_versions():
+                with registry.cursor() as cr:
+                    self.with_env(self.env(cr=cr))._bump(*sorted(pending))
+        pending.update(names)
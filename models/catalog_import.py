@@ -0,0 +1,310 @@
+import contextlib
+import csv
+import io
+import itertools
+import json
+import logging
+import threading
+
+import psycopg2
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError, ValidationError
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+_logger = logging.getLogger(__name__)
+
+# Colonnes acceptees par modele cible (champ technique, ou code de categorie)
+IMPORT_COLUMNS = {
+    'bike.bike': [
+        'reference', 'name', 'brand', 'model_year', 'category_code', 'bike_type', 'size', 'color',
+        'frame_material', 'wheel_size', 'gears_count', 'weight', 'sale_price', 'cost_price',
+        'rental_price_hour', 'rental_price_day', 'rental_price_week', 'rental_price_month',
+        'is_for_sale', 'is_for_rent', 'stock_quantity',
+    ],
+    'bike.accessory': [
+        'reference', 'name', 'category', 'brand', 'sale_price', 'cost_price', 'stock_quantity',
+        'stock_min', 'compatible_bike_types',
+    ],
+}
+IMPORT_REQUIRED = {
+    'bike.bike': ['name', 'brand', 'category_code'],
+    'bike.accessory': ['name', 'category', 'sale_price'],
+}
+TRUE_VALUES = ('1', 'true', 'vrai', 'oui', 'yes', 'x')
+
+
+def _to_int(value):
+    return int(float(str(value).replace(',', '.')))
+
+
+def _to_float(value):
+    return float(str(value).replace(',', '.'))
+
+
+def _to_bool(value):
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def _to_char(value):
+    return str(value).strip()
+
+
+class BikeCatalogImport(models.Model):
+    _name = 'bike.catalog.import'
+    _description = 'Import en masse du catalogue'
+    _inherit = ['mail.thread']
+    _order = 'id desc'
+
+    name = fields.Char(string='Nom', required=True)
+    target_model = fields.Selection([
+        ('bike.bike', 'Velos'),
+        ('bike.accessory', 'Accessoires'),
+    ], string='Import de', required=True, default='bike.bike')
+    file = fields.Binary(string='Fichier (CSV ou XLSX)', required=True, attachment=True)
+    filename = fields.Char(string='Nom du fichier')
+    chunk_size = fields.Integer(string='Taille des lots', default=500, required=True)
+
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Termine'),
+        ('failed', 'En echec'),
+    ], string='Statut', default='draft', required=True, tracking=True)
+    last_row = fields.Integer(string='Derniere ligne traitee', readonly=True, copy=False,
+                              help="Ligne du fichier a partir de laquelle l'import reprend.")
+    imported_count = fields.Integer(string='Lignes importees', readonly=True, copy=False)
+    error_count = fields.Integer(string='Lignes en erreur', readonly=True, copy=False)
+    error_ids = fields.One2many('bike.catalog.import.error', 'import_id', string='Erreurs')
+    error_message = fields.Text(string='Erreur', readonly=True, copy=False)
+
+    company_id = fields.Many2one('res.company', string='Societe', default=lambda self: self.env.company)
+
+    def action_start(self):
+        self.filtered(lambda i: i.state in ('draft', 'failed')).write({'state': 'pending', 'error_message': False})
+        self.env.ref('bike_shop.ir_cron_catalog_import')._trigger()
+
+    @api.model
+    def _cron_process_imports(self):
+        # Les imports 'running' sont repris a last_row: un worker a pu etre tue en cours de route
+        for catalog_import in self.search([('state', 'in', ['pending', 'running'])], order='id'):
+            catalog_import._process()
+
+    def _process(self):
+        """Importe le fichier par lots, avec un commit par lot.
+
+        Le fichier est lu au fil de l'eau; les lignes deja traitees
+        (``last_row``) sont sautees, ce qui rend la reprise sans risque.
+        """
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        Model = self.env[self.target_model].with_company(self.company_id).with_context(
+            tracking_disable=True,
+            mail_create_nolog=True,
+            mail_create_nosubscribe=True,
+            mail_notrack=True,
+        )
+        self.state = 'running'
+        try:
+            converters = self._get_converters()
+            with self._open_rows() as (header, rows):
+                rows = ((number, values) for number, values in rows if number > self.last_row)
+                while chunk := list(itertools.islice(rows, self.chunk_size)):
+                    self._import_chunk(Model, converters, header, chunk)
+                    if auto_commit:
+                        self.env.cr.commit()
+        except (UserError, ValueError, csv.Error, UnicodeDecodeError) as e:
+            self.write({'state': 'failed', 'error_message': str(e)})
+            if auto_commit:
+                self.env.cr.commit()
+            return
+
+        self.state = 'done'
+        self.message_post(
+            body=f"Import termine: {self.imported_count} ligne(s) importee(s), {self.error_count} en erreur.",
+        )
+        if auto_commit:
+            self.env.cr.commit()
+
+    def _import_chunk(self, Model, converters, header, chunk):
+        """Valide et cree un lot de lignes; les lignes fautives sont isolees et rapportees."""
+        valid, errors = [], []
+        for number, values in chunk:
+            row = values
+            try:
+                row = self._get_row(header, values)
+                valid.append((number, row, self._convert_row(converters, row)))
+            except ValueError as e:
+                errors.append((number, row, str(e)))
+
+        created = 0
+        if valid:
+            try:
+                with self.env.cr.savepoint():
+                    Model.create([vals for _number, _row, vals in valid])
+                created = len(valid)
+            except (UserError, ValidationError, psycopg2.Error):
+                # Lot refuse (doublon, contrainte): repli ligne a ligne pour isoler les fautives
+                for number, row, vals in valid:
+                    try:
+                        with self.env.cr.savepoint():
+                            Model.create([vals])
+                        created += 1
+                    except (UserError, ValidationError, psycopg2.Error) as e:
+                        errors.append((number, row, str(e).strip()))
+
+        self.env['bike.catalog.import.error'].create([{
+            'import_id': self.id,
+            'row': number,
+            'message': message,
+            'data': json.dumps(row, default=str, ensure_ascii=False),
+        } for number, row, message in errors])
+        self.write({
+            'last_row': chunk[-1][0],
+            'imported_count': self.imported_count + created,
+            'error_count': self.error_count + len(errors),
+        })
+
+    def _open_file(self):
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', '=', 'file'),
+        ], limit=1)
+        if not attachment:
+            raise UserError("Aucun fichier a importer.")
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw or b'')
+
+    @contextlib.contextmanager
+    def _open_rows(self):
+        """En-tete valide et (numero de ligne, valeurs) lus au fil de l'eau.
+
+        Le fichier (et le classeur XLSX) est ferme a la sortie du bloc, meme
+        si la lecture est interrompue.
+        """
+        with self._open_file() as stream:
+            if (self.filename or '').lower().endswith('.xlsx'):
+                if openpyxl is None:
+                    raise UserError("La lecture des fichiers XLSX necessite la librairie openpyxl.")
+                workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+                with contextlib.closing(workbook):
+                    rows = workbook.active.iter_rows(values_only=True)
+                    header = self._get_header(str(cell or '').strip() for cell in next(rows, ()))
+                    yield header, (
+                        (number, values) for number, values in enumerate(rows, start=2)
+                        if any(value not in (None, '') for value in values)
+                    )
+            else:
+                text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+                first_line = text.readline()
+                delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+                reader = csv.reader(itertools.chain([first_line], text), delimiter=delimiter)
+                header = self._get_header(column.strip() for column in next(reader, []))
+                yield header, (
+                    (number, values) for number, values in enumerate(reader, start=2)
+                    if any(value.strip() for value in values)
+                )
+
+    def _get_header(self, columns):
+        header = list(columns)
+        # Cellules vides en fin d'en-tete (feuille plus large que le tableau)
+        while header and not header[-1]:
+            header.pop()
+        self._check_header(header)
+        return header
+
+    @api.model
+    def _get_row(self, header, values):
+        """{colonne: valeur} d'une ligne; ValueError si elle n'a pas autant de colonnes que l'en-tete."""
+        values = list(values)
+        while len(values) > len(header) and str(values[-1] or '').strip() == '':
+            values.pop()
+        if len(values) != len(header):
+            raise ValueError(f"La ligne compte {len(values)} colonne(s) au lieu de {len(header)}")
+        return dict(zip(header, values))
+
+    def _check_header(self, header):
+        columns = IMPORT_COLUMNS[self.target_model]
+        unknown = [column for column in header if column and column not in columns]
+        if unknown:
+            raise UserError(
+                f"Colonnes inconnues: {', '.join(unknown)}. Colonnes acceptees: {', '.join(columns)}"
+            )
+        missing = [column for column in IMPORT_REQUIRED[self.target_model] if column not in header]
+        if missing:
+            raise UserError(f"Colonnes obligatoires manquantes: {', '.join(missing)}")
+
+    def _get_converters(self):
+        """Convertisseur par colonne, tables de correspondance chargees une fois par import."""
+        Model = self.env[self.target_model]
+        converters = {}
+        for column in IMPORT_COLUMNS[self.target_model]:
+            if column == 'category_code':
+                categories = {
+                    category.code.lower(): category.id for category in self.env['bike.category'].search([])
+                }
+                converters[column] = ('category_id', self._lookup_converter(categories, "Code de categorie"))
+                continue
+            field = Model._fields[column]
+            if field.type == 'selection':
+                choices = {}
+                for key, label in field._description_selection(self.env):
+                    choices[key.lower()] = key
+                    choices[label.lower()] = key
+                converter = self._lookup_converter(choices, field.string)
+            elif field.type == 'integer':
+                converter = _to_int
+            elif field.type in ('float', 'monetary'):
+                converter = _to_float
+            elif field.type == 'boolean':
+                converter = _to_bool
+            else:
+                converter = _to_char
+            converters[column] = (column, converter)
+        return converters
+
+    @api.model
+    def _lookup_converter(self, choices, label):
+        def convert(value):
+            key = str(value).strip().lower()
+            if key not in choices:
+                raise ValueError(f"{label}: valeur inconnue '{value}'")
+            return choices[key]
+        return convert
+
+    def _convert_row(self, converters, row):
+        vals = {}
+        for column, value in row.items():
+            if not column or value is None or str(value).strip() == '':
+                continue
+            fname, converter = converters[column]
+            try:
+                vals[fname] = converter(value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Colonne {column}: {e}") from None
+        missing = [
+            column for column in IMPORT_REQUIRED[self.target_model]
+            if converters[column][0] not in vals
+        ]
+        if missing:
+            raise ValueError(f"Valeur obligatoire manquante: {', '.join(missing)}")
+        return vals
+
+
+class BikeCatalogImportError(models.Model):
+    _name = 'bike.catalog.import.error'
+    _description = 'Ligne en erreur d\'un import du catalogue'
+    _order = 'row'
+
+    import_id = fields.Many2one('bike.catalog.import', string='Import', required=True, ondelete='cascade',
+                                index=True)
+    row = fields.Integer(string='Ligne')
+    message = fields.Char(string='Erreur')
+    data = fields.Text(string='Contenu de la ligne')
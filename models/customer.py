@@ -7,9 +7,9 @@ class ResPartner(models.Model):
     is_bike_customer = fields.Boolean(string='Client Bike Shop', default=False)
     
     rental_ids = fields.One2many('bike.rental', 'customer_id', string='Locations')
-    rental_count = fields.Integer(string='Nombre de locations', compute='_compute_rental_stats')
+    rental_count = fields.Integer(string='Nombre de locations', compute='_compute_rental_stats', store=True)
     rental_total_spent = fields.Monetary(string='Total depense en locations', compute='_compute_rental_stats',
-                                         currency_field='currency_id')
+                                         store=True, currency_field='currency_id')
     
     contract_ids = fields.One2many('bike.rental.contract', 'customer_id', string='Contrats')
     contract_count = fields.Integer(string='Nombre de contrats', compute='_compute_contract_count')
@@ -38,27 +38,63 @@ class ResPartner(models.Model):
     
     customer_notes = fields.Text(string='Notes client')
 
-    has_active_rental = fields.Boolean(string='Location active', compute='_compute_has_active_rental')
-    current_rental_id = fields.Many2one('bike.rental', string='Location en cours', compute='_compute_has_active_rental')
+    has_active_rental = fields.Boolean(string='Location active', compute='_compute_has_active_rental', store=True)
+    current_rental_id = fields.Many2one('bike.rental', string='Location en cours', compute='_compute_has_active_rental',
+                                        store=True)
 
     @api.depends('rental_ids', 'rental_ids.state', 'rental_ids.total_price')
     def _compute_rental_stats(self):
+        stored = self.filtered('id')
+        stats = {
+            partner.id: (count, total or 0.0)
+            for partner, count, total in self.env['bike.rental']._read_group(
+                [('customer_id', 'in', stored.ids), ('state', '!=', 'cancelled')],
+                ['customer_id'],
+                ['__count', 'total_price:sum'],
+            )
+        } if stored else {}
         for partner in self:
-            rentals = partner.rental_ids.filtered(lambda r: r.state != 'cancelled')
-            partner.rental_count = len(rentals)
-            partner.rental_total_spent = sum(rentals.mapped('total_price'))
+            if partner.id:
+                partner.rental_count, partner.rental_total_spent = stats.get(partner.id, (0, 0.0))
+            else:
+                rentals = partner.rental_ids.filtered(lambda r: r.state != 'cancelled')
+                partner.rental_count = len(rentals)
+                partner.rental_total_spent = sum(rentals.mapped('total_price'))
 
     @api.depends('contract_ids')
     def _compute_contract_count(self):
+        stored = self.filtered('id')
+        counts = dict(self.env['bike.rental.contract']._read_group(
+            [('customer_id', 'in', stored.ids)], ['customer_id'], ['__count'],
+        )) if stored else {}
         for partner in self:
-            partner.contract_count = len(partner.contract_ids)
+            if partner.id:
+                partner.contract_count = counts.get(partner, 0)
+            else:
+                partner.contract_count = len(partner.contract_ids)
 
     @api.depends('rental_ids', 'rental_ids.state')
     def _compute_has_active_rental(self):
+        stored = self.filtered('id')
+        current = {}
+        if stored:
+            self.env['bike.rental'].flush_model(['customer_id', 'state', 'date_start'])
+            # Location active la plus recente par client, en une requete
+            self.env.cr.execute("""
+                SELECT DISTINCT ON (customer_id) customer_id, id
+                  FROM bike_rental
+                 WHERE customer_id IN %s
+                   AND state IN ('confirmed', 'ongoing', 'overdue')
+              ORDER BY customer_id, date_start DESC, id DESC
+            """, [tuple(stored.ids)])
+            current = dict(self.env.cr.fetchall())
         for partner in self:
-            active = partner.rental_ids.filtered(lambda r: r.state in ['confirmed', 'ongoing'])
-            partner.has_active_rental = bool(active)
-            partner.current_rental_id = active[0] if active else False
+            if partner.id:
+                rental = self.env['bike.rental'].browse(current.get(partner.id))
+            else:
+                rental = partner.rental_ids.filtered(lambda r: r.state in ['confirmed', 'ongoing', 'overdue'])[:1]
+            partner.has_active_rental = bool(rental)
+            partner.current_rental_id = rental
 
     def action_view_rentals(self):
         self.ensure_one()
@@ -0,0 +1,242 @@
+import base64
+import contextlib
+import hashlib
+import io
+import itertools
+import logging
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools.image import image_process
+
+from .image_mixin import IMAGE_VARIANT_SIZES
+
+_logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+# Modele cible -> (champ de correspondance, {champ image: cote maximale})
+IMAGE_TARGETS = {
+    'bike.bike': ('reference', dict(image_1920=1920, **IMAGE_VARIANT_SIZES)),
+    'bike.accessory': ('reference', dict(image_1920=1920, **IMAGE_VARIANT_SIZES)),
+    'bike.category': ('code', {'image': 256}),
+}
+
+# Pillow relache le GIL pendant le decodage, le redimensionnement et l'encodage
+IMAGE_WORKERS = max(1, min(os.cpu_count() or 1, 4))
+
+
+def _read_file(path):
+    with open(path, 'rb') as photo:
+        return photo.read()
+
+
+def _resize_variants(data, sizes):
+    """Decode une photo et produit toutes ses variantes; (variantes, erreur)."""
+    try:
+        return {fname: image_process(data, size=(size, size)) for fname, size in sizes.items()}, None
+    except Exception as e:  # noqa: BLE001 - l'erreur est rapportee pour cette photo seulement
+        return None, str(e)
+
+
+class BikeImageImport(models.Model):
+    _name = 'bike.image.import'
+    _description = 'Import des photos du catalogue'
+    _inherit = ['mail.thread']
+    _order = 'id desc'
+
+    name = fields.Char(string='Nom', required=True)
+    target_model = fields.Selection([
+        ('bike.bike', 'Velos (par reference)'),
+        ('bike.accessory', 'Accessoires (par reference)'),
+        ('bike.category', 'Categories (par code)'),
+    ], string='Photos de', required=True, default='bike.bike')
+    source = fields.Selection([
+        ('zip', 'Archive ZIP'),
+        ('directory', 'Repertoire du serveur'),
+    ], string='Source', required=True, default='zip')
+    file = fields.Binary(string='Archive ZIP', attachment=True)
+    filename = fields.Char(string='Nom du fichier')
+    directory = fields.Char(string='Repertoire', groups='base.group_system',
+                            help="Chemin d'un repertoire de photos sur le serveur.")
+    chunk_size = fields.Integer(string='Taille des lots', default=100, required=True)
+
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Termine'),
+        ('failed', 'En echec'),
+    ], string='Statut', default='draft', required=True, tracking=True)
+    last_index = fields.Integer(string='Photos traitees', readonly=True, copy=False,
+                                help="Nombre de photos deja traitees; l'import reprend a partir de la suivante.")
+    updated_count = fields.Integer(string='Photos importees', readonly=True, copy=False)
+    unchanged_count = fields.Integer(string='Photos inchangees', readonly=True, copy=False)
+    unmatched_count = fields.Integer(string='Sans correspondance', readonly=True, copy=False)
+    error_count = fields.Integer(string='Photos en erreur', readonly=True, copy=False)
+    photo_errors = fields.Text(string='Photos refusees', readonly=True, copy=False)
+    error_message = fields.Text(string='Erreur', readonly=True, copy=False)
+
+    @api.constrains('source', 'file', 'directory')
+    def _check_source(self):
+        for image_import in self.sudo():
+            if image_import.source == 'zip' and not image_import.file:
+                raise ValidationError("Veuillez joindre une archive ZIP.")
+            if image_import.source == 'directory' and not image_import.directory:
+                raise ValidationError("Veuillez indiquer le repertoire des photos.")
+
+    def action_start(self):
+        if any(image_import.source == 'directory' for image_import in self) \
+                and not self.env.user.has_group('base.group_system'):
+            raise UserError("Seul un administrateur peut importer depuis un repertoire du serveur.")
+        self.filtered(lambda i: i.state in ('draft', 'failed')).write({'state': 'pending', 'error_message': False})
+        self.env.ref('bike_shop.ir_cron_image_import')._trigger()
+
+    @api.model
+    def _cron_process_imports(self):
+        # Les imports 'running' sont repris a last_index: un worker a pu etre tue en cours de route
+        for image_import in self.search([('state', 'in', ['pending', 'running'])], order='id'):
+            image_import._process()
+
+    def _process(self):
+        """Importe les photos par lots, avec un commit par lot.
+
+        Les photos sont lues dans un ordre stable; celles deja traitees
+        (``last_index``) sont sautees, ce qui rend la reprise sans risque.
+        """
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        match_field, sizes = IMAGE_TARGETS[self.target_model]
+        Model = self.env[self.target_model].with_context(
+            active_test=False,
+            tracking_disable=True,
+            mail_notrack=True,
+        )
+        self.state = 'running'
+        try:
+            # Correspondance exacte (sans tenir compte de la casse) chargee une fois par import
+            targets = {
+                record[match_field].strip().lower(): record.id
+                for record in Model.search_fetch([(match_field, '!=', False)], [match_field])
+            }
+            with self._open_photos() as photos, ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as executor:
+                remaining = itertools.islice(photos, self.last_index, None)
+                while chunk := list(itertools.islice(remaining, self.chunk_size)):
+                    self._import_chunk(Model, executor, targets, sizes, chunk)
+                    if auto_commit:
+                        self.env.cr.commit()
+        except (UserError, OSError, zipfile.BadZipFile) as e:
+            self.write({'state': 'failed', 'error_message': str(e)})
+            if auto_commit:
+                self.env.cr.commit()
+            return
+
+        self.state = 'done'
+        _logger.info("Import de photos %s termine: %s photo(s) importee(s)", self.id, self.updated_count)
+        self.message_post(
+            body=f"Import termine: {self.updated_count} photo(s) importee(s), "
+                 f"{self.unchanged_count} inchangee(s), {self.unmatched_count} sans correspondance, "
+                 f"{self.error_count} en erreur.",
+        )
+        if auto_commit:
+            self.env.cr.commit()
+
+    def _import_chunk(self, Model, executor, targets, sizes, chunk):
+        """Redimensionne un lot de photos en parallele et ecrit chaque fiche en une ecriture.
+
+        Une photo dont l'empreinte SHA-1 correspond a ``image_source_checksum``
+        est ignoree sans etre decodee.
+        """
+        matched = [(name, read, targets[key]) for key, name, read in chunk if key in targets]
+        records = Model.browse([record_id for _name, _read, record_id in matched])
+        records.fetch(['image_source_checksum'])
+        tasks = []
+        unchanged = 0
+        for name, read, record_id in matched:
+            data = read()
+            checksum = hashlib.sha1(data).hexdigest()
+            if Model.browse(record_id).image_source_checksum == checksum:
+                unchanged += 1
+                continue
+            tasks.append((name, record_id, checksum, executor.submit(_resize_variants, data, sizes)))
+
+        errors = []
+        for name, record_id, checksum, future in tasks:
+            variants, error = future.result()
+            if error:
+                errors.append(f"{name}: {error}")
+                continue
+            vals = {fname: base64.b64encode(content) for fname, content in variants.items()}
+            vals['image_source_checksum'] = checksum
+            try:
+                with self.env.cr.savepoint():
+                    Model.browse(record_id).write(vals)
+            except (UserError, ValidationError, psycopg2.Error) as e:
+                errors.append(f"{name}: {str(e).strip()}")
+
+        self.write({
+            'last_index': self.last_index + len(chunk),
+            'updated_count': self.updated_count + len(tasks) - len(errors),
+            'unchanged_count': self.unchanged_count + unchanged,
+            'unmatched_count': self.unmatched_count + len(chunk) - len(matched),
+            'error_count': self.error_count + len(errors),
+            'photo_errors': "\n".join(filter(None, [self.photo_errors] + errors)) or False,
+        })
+        self.env.flush_all()
+        # Les images du lot n'ont plus a rester en memoire
+        Model.invalidate_model()
+
+    @contextlib.contextmanager
+    def _open_photos(self):
+        """(cle de correspondance, nom de fichier, lecteur du contenu), dans un ordre stable.
+
+        L'archive est ouverte depuis le fichier de la piece jointe: seules les
+        photos du lot en cours sont chargees en memoire.
+        """
+        if self.source == 'zip':
+            with self._open_file() as stream, zipfile.ZipFile(stream) as archive:
+                yield self._iter_archive(archive)
+        else:
+            yield self._iter_directory(self.sudo().directory)
+
+    @api.model
+    def _iter_archive(self, archive):
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if not info.is_dir() and self._is_photo(name):
+                yield self._get_photo_key(name), name, lambda info=info: archive.read(info)
+
+    @api.model
+    def _iter_directory(self, directory):
+        if not directory or not os.path.isdir(directory):
+            raise UserError("Repertoire introuvable sur le serveur.")
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if self._is_photo(name) and os.path.isfile(path):
+                yield self._get_photo_key(name), name, lambda path=path: _read_file(path)
+
+    @api.model
+    def _is_photo(self, name):
+        return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+    @api.model
+    def _get_photo_key(self, name):
+        return os.path.splitext(name)[0].strip().lower()
+
+    def _open_file(self):
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', '=', 'file'),
+        ], limit=1)
+        if not attachment:
+            raise UserError("Aucune archive a importer.")
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw or b'')
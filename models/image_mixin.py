@@ -0,0 +1,46 @@
+from odoo import models, fields, api
+
+# Variantes stockees: champ -> cote maximale (pixels)
+IMAGE_VARIANT_SIZES = {
+    'image_1024': 1024,
+    'image_512': 512,
+    'image_256': 256,
+    'image_128': 128,
+}
+
+
+class BikeShopImageSourceMixin(models.AbstractModel):
+    """Empreinte de la photo importee, pour ignorer les photos deja traitees."""
+    _name = 'bike.shop.image.source.mixin'
+    _description = 'Photo source du catalogue'
+
+    image_source_checksum = fields.Char(string='Empreinte de la photo source', copy=False, readonly=True)
+
+
+class BikeShopImageMixin(models.AbstractModel):
+    """Image principale et variantes redimensionnees stockees.
+
+    Les variantes sont recalculees depuis ``image_1920`` lors d'une saisie
+    unitaire; le traitement d'images en masse les ecrit deja redimensionnees
+    dans la meme ecriture, ce qui evite un second redimensionnement par l'ORM.
+    """
+    _name = 'bike.shop.image.mixin'
+    _description = 'Images du catalogue'
+    _inherit = ['bike.shop.image.source.mixin']
+
+    image_1920 = fields.Image(string='Image')
+    image_1024 = fields.Image(string='Image 1024', compute='_compute_image_variants', store=True,
+                              max_width=1024, max_height=1024)
+    image_512 = fields.Image(string='Image 512', compute='_compute_image_variants', store=True,
+                             max_width=512, max_height=512)
+    image_256 = fields.Image(string='Image 256', compute='_compute_image_variants', store=True,
+                             max_width=256, max_height=256)
+    image_128 = fields.Image(string='Image miniature', compute='_compute_image_variants', store=True,
+                             max_width=128, max_height=128)
+
+    @api.depends('image_1920')
+    def _compute_image_variants(self):
+        for record in self:
+            # Le champ Image redimensionne a sa taille maximale a l'ecriture
+            for fname in IMAGE_VARIANT_SIZES:
+                record[fname] = record.image_1920
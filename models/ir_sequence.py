@@ -0,0 +1,44 @@
+from odoo import models, api
+
+
+class IrSequence(models.Model):
+    _inherit = 'ir.sequence'
+
+    @api.model
+    def _next_by_code_batch(self, sequence_code, count):
+        """Reserve ``count`` numeros d'un coup (equivalent groupe de next_by_code)."""
+        if count <= 0:
+            return []
+        self.check_access('read')
+        company_id = self.env.company.id
+        sequence = self.search([
+            ('code', '=', sequence_code),
+            ('company_id', 'in', [company_id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            return [False] * count
+        return sequence._next_batch(count)
+
+    def _next_batch(self, count):
+        self.ensure_one()
+        if self.use_date_range:
+            # Les plages de dates ont leur propre compteur: chemin standard
+            return [self._next() for _i in range(count)]
+        if self.implementation == 'standard':
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                (f'ir_sequence_{self.id:03d}', count),
+            )
+            numbers = [row[0] for row in self.env.cr.fetchall()]
+        else:
+            self.env.cr.execute("""
+                UPDATE ir_sequence
+                   SET number_next = number_next + number_increment * %s
+                 WHERE id = %s
+             RETURNING number_next, number_increment
+            """, (count, self.id))
+            number_next, increment = self.env.cr.fetchone()
+            self.invalidate_recordset(['number_next'])
+            first = number_next - increment * count
+            numbers = [first + increment * i for i in range(count)]
+        return [self.get_next_char(number) for number in numbers]
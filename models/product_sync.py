@@ -0,0 +1,161 @@
+import logging
+import threading
+
+from odoo import models, fields, api
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+
+class BikeShopProductSyncMixin(models.AbstractModel):
+    """Synchronisation incrementale vers ``product.product``.
+
+    Les champs suivis modifies sont notes dans ``product_sync_pending``; la
+    synchronisation cree en un lot les produits manquants et ne recopie sur
+    les produits existants que les champs notes.
+    """
+    _name = 'bike.shop.product.sync.mixin'
+    _description = 'Synchronisation des produits'
+
+    product_id = fields.Many2one('product.product', string='Produit associe', ondelete='set null')
+    product_sync_pending = fields.Char(string='Champs produit a synchroniser', copy=False, readonly=True,
+                                       index='btree_not_null')
+
+    def _get_product_field_map(self):
+        """Champ source -> champ de ``product.product``."""
+        return {
+            'name': 'name',
+            'reference': 'default_code',
+            'sale_price': 'list_price',
+            'cost_price': 'standard_price',
+            'image_1920': 'image_1920',
+        }
+
+    def _get_product_create_domain(self):
+        """Enregistrements pour lesquels un produit doit etre cree."""
+        return []
+
+    def _prepare_product_vals(self, fnames=None):
+        self.ensure_one()
+        field_map = self._get_product_field_map()
+        return {
+            field_map[fname]: self[fname]
+            for fname in (fnames or field_map)
+        }
+
+    def write(self, vals):
+        res = super().write(vals)
+        changed = set(self._get_product_field_map()).intersection(vals)
+        if changed:
+            self._mark_product_sync(changed)
+        return res
+
+    def _mark_product_sync(self, fnames):
+        """Ajoute des champs a synchroniser, en une ecriture par valeur en attente."""
+        groups = {}
+        for record in self.filtered('product_id'):
+            groups.setdefault(record.product_sync_pending or '', []).append(record.id)
+        for pending, ids in groups.items():
+            merged = ','.join(sorted(set(filter(None, pending.split(','))) | set(fnames)))
+            if merged != pending:
+                self.browse(ids).write({'product_sync_pending': merged})
+
+    def _create_product(self):
+        """Cree en un seul ``create`` les produits manquants de l'ensemble des enregistrements."""
+        records = self.filtered(lambda record: not record.product_id)
+        if records:
+            products = self.env['product.product'].create([
+                dict(record._prepare_product_vals(), **record._get_product_extra_vals())
+                for record in records
+            ])
+            records._set_product_ids(products)
+        return self.product_id
+
+    def _get_product_extra_vals(self):
+        return {
+            'type': 'consu',
+            'is_storable': True,
+            'purchase_ok': True,
+        }
+
+    def _set_product_ids(self, products):
+        """Rattache les produits crees et vide les champs en attente, en une requete."""
+        self.flush_recordset(['product_id', 'product_sync_pending'])
+        self.env.cr.execute(SQL(
+            """
+            UPDATE %s t
+               SET product_id = v.product_id, product_sync_pending = NULL
+              FROM (VALUES %s) AS v(id, product_id)
+             WHERE t.id = v.id
+            """,
+            SQL.identifier(self._table),
+            SQL(", ").join(SQL("(%s, %s)", record.id, product.id) for record, product in zip(self, products)),
+        ))
+        self.invalidate_recordset(['product_id', 'product_sync_pending'])
+
+    def _push_product_changes(self):
+        """Recopie les champs en attente sur les produits, une ecriture par jeu de valeurs."""
+        batches = {}
+        pushed = {}
+        for record in self.filtered('product_id'):
+            pending = record.product_sync_pending or ''
+            fnames = [fname for fname in pending.split(',') if fname]
+            vals = record._prepare_product_vals(fnames)
+            key = tuple(sorted(vals.items()))
+            batches.setdefault(key, []).append(record.product_id.id)
+            pushed.setdefault(pending, []).append(record.id)
+        for key, product_ids in batches.items():
+            self.env['product.product'].browse(product_ids).write(dict(key))
+        self._clear_product_sync(pushed)
+
+    def _clear_product_sync(self, pushed):
+        """Retire les champs recopies de ``product_sync_pending``.
+
+        ``pushed``: valeur lue avant la recopie -> ids. Un champ note pendant
+        la recopie (ecriture concurrente) reste en attente pour le prochain passage.
+        """
+        self.flush_model(['product_sync_pending'])
+        for pending, ids in pushed.items():
+            fnames = [fname for fname in pending.split(',') if fname]
+            self.env.cr.execute(SQL(
+                """
+                UPDATE %s
+                   SET product_sync_pending = NULLIF(array_to_string(ARRAY(
+                           SELECT fname
+                             FROM unnest(string_to_array(product_sync_pending, ',')) AS fname
+                            WHERE fname != ALL(%s)
+                         ORDER BY fname
+                       ), ','), '')
+                 WHERE id = ANY(%s)
+                """,
+                SQL.identifier(self._table), fnames, ids,
+            ))
+        self.browse([record_id for ids in pushed.values() for record_id in ids]).invalidate_recordset(
+            ['product_sync_pending'],
+        )
+
+    @api.model
+    def _sync_products(self, full=False, chunk_size=500):
+        """Cree les produits manquants et propage les champs modifies, par lots.
+
+        ``full`` marque tous les champs suivis comme a synchroniser (remise a
+        niveau apres installation ou import direct en base).
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        if full:
+            self.search([('product_id', '!=', False)])._mark_product_sync(self._get_product_field_map())
+
+        to_create = self.search(self._get_product_create_domain() + [('product_id', '=', False)]).ids
+        to_update = self.search([('product_sync_pending', '!=', False), ('product_id', '!=', False)]).ids
+        for method, ids in (('_create_product', to_create), ('_push_product_changes', to_update)):
+            for start in range(0, len(ids), chunk_size):
+                getattr(self.browse(ids[start:start + chunk_size]), method)()
+                if auto_commit:
+                    self.env.cr.commit()
+                self.env.invalidate_all()
+        _logger.info("%s: %s produit(s) cree(s), %s produit(s) mis a jour",
+                     self._name, len(to_create), len(to_update))
+
+    @api.model
+    def _cron_sync_products(self):
+        self._sync_products()
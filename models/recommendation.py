@@ -0,0 +1,241 @@
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api, tools
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Nombre de recommandations conservees par source
+RECOMMENDATION_DEPTH = 20
+# Recouvrement entre deux passages: write_date est l'heure de debut de la
+# transaction, une location validee apres le passage peut dater d'avant
+RECOMMENDATION_MARGIN = timedelta(hours=1)
+
+
+class BikeRecommendation(models.Model):
+    _name = 'bike.recommendation'
+    _description = 'Recommandation de velos et accessoires'
+    _order = 'score desc, id'
+
+    source_bike_id = fields.Many2one('bike.bike', string='Velo source', ondelete='cascade')
+    source_accessory_id = fields.Many2one('bike.accessory', string='Accessoire source', ondelete='cascade')
+    bike_id = fields.Many2one('bike.bike', string='Velo recommande', ondelete='cascade')
+    accessory_id = fields.Many2one('bike.accessory', string='Accessoire recommande', ondelete='cascade')
+    score = fields.Float(string='Score', readonly=True)
+
+    def init(self):
+        super().init()
+        tools.create_index(self.env.cr, 'bike_recommendation_source_bike_index', self._table,
+                           ['source_bike_id', 'score DESC'], where='source_bike_id IS NOT NULL')
+        tools.create_index(self.env.cr, 'bike_recommendation_source_accessory_index', self._table,
+                           ['source_accessory_id', 'score DESC'], where='source_accessory_id IS NOT NULL')
+
+    @api.model
+    def _recommend(self, source_field, sources, target_field, limit, domain=None):
+        """Meilleures recommandations pour un lot de sources, en une requete indexee.
+
+        Les scores des differentes sources sont additionnes; ``domain`` filtre
+        les enregistrements recommandes (stock, etat...).
+        """
+        if not sources:
+            return self.env[self._fields[target_field].comodel_name]
+        lookup = [(source_field, 'in', sources.ids), (target_field, '!=', False)]
+        if self._fields[target_field].comodel_name == sources._name:
+            lookup.append((target_field, 'not in', sources.ids))
+        if domain:
+            lookup.append((target_field, 'any', domain))
+        groups = self.sudo()._read_group(
+            lookup, [target_field], ['score:sum'], order='score:sum desc', limit=limit,
+        )
+        return self.env[self._fields[target_field].comodel_name].browse(
+            [record.id for record, _score in groups]
+        )
+
+    @api.model
+    def _cron_rebuild_recommendations(self, full=False):
+        """Recalcule les recommandations touchees par les locations modifiees.
+
+        Seules les sources concernees par une location creee ou modifiee depuis
+        le dernier passage sont recalculees; ``full`` reconstruit toute la table.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        last_run = ICP.get_param('bike_shop.recommendation_last_run')
+        run_start = self.env.cr.now()
+        self.env['bike.rental'].flush_model(['bike_id', 'customer_id', 'state', 'accessories_ids'])
+        self.flush_model()
+
+        if full or not last_run:
+            self.env.cr.execute("SELECT id FROM bike_bike")
+            bike_ids = [row[0] for row in self.env.cr.fetchall()]
+            self.env.cr.execute("SELECT id FROM bike_accessory")
+            accessory_ids = [row[0] for row in self.env.cr.fetchall()]
+            self.env['bike.recommendation.stale'].sudo().search([]).unlink()
+        else:
+            bike_ids, accessory_ids = self._get_stale_sources(last_run)
+
+        self._rebuild_bike_sources(bike_ids)
+        self._rebuild_accessory_sources(accessory_ids)
+        self.env.invalidate_all()
+        ICP.set_param('bike_shop.recommendation_last_run',
+                      fields.Datetime.to_string(run_start - RECOMMENDATION_MARGIN))
+        _logger.info("Recommandations recalculees: %s velo(s), %s accessoire(s)",
+                     len(bike_ids), len(accessory_ids))
+
+    def _get_accessory_relation(self):
+        field = self.env['bike.rental']._fields['accessories_ids']
+        return SQL.identifier(field.relation), SQL.identifier(field.column1), SQL.identifier(field.column2)
+
+    @api.model
+    def _get_stale_sources(self, since):
+        """Velos et accessoires dont les recommandations dependent de locations modifiees.
+
+        Un velo est concerne des qu'un client qui l'a loue a une location
+        modifiee: les paires de co-location de ce client ont pu changer. Les
+        sources notees avant une suppression ou un retrait d'accessoire
+        (``bike.recommendation.stale``) sont ajoutees puis consommees.
+        """
+        bike_ids, accessory_ids = self._get_rental_sources(SQL("changed.write_date > %s", since))
+        Stale = self.env['bike.recommendation.stale'].sudo()
+        stale = Stale.search_fetch([], ['bike_id', 'accessory_id'])
+        bike_ids = set(bike_ids).union(stale.bike_id.ids)
+        accessory_ids = set(accessory_ids).union(stale.accessory_id.ids)
+        stale.unlink()
+        return list(bike_ids), list(accessory_ids)
+
+    def _get_rental_sources(self, condition):
+        """Sources dont les scores dependent des locations ``changed`` filtrees par ``condition``."""
+        self.env.cr.execute(SQL("""
+            SELECT DISTINCT other.bike_id
+              FROM bike_rental changed
+              JOIN bike_rental other ON other.customer_id = changed.customer_id
+             WHERE %s
+        """, condition))
+        bike_ids = [row[0] for row in self.env.cr.fetchall()]
+        relation, rental_col, accessory_col = self._get_accessory_relation()
+        self.env.cr.execute(SQL("""
+            SELECT DISTINCT rel.%s
+              FROM %s rel
+              JOIN bike_rental changed ON changed.id = rel.%s
+             WHERE %s
+        """, accessory_col, relation, rental_col, condition))
+        accessory_ids = [row[0] for row in self.env.cr.fetchall()]
+        return bike_ids, accessory_ids
+
+    @api.model
+    def _mark_rentals_stale(self, rentals):
+        """Note les sources touchees par des locations avant leur suppression ou modification.
+
+        Une fois la location supprimee, ou l'accessoire retire, plus rien ne
+        relie ces sources aux locations modifiees depuis le dernier passage.
+        """
+        if not rentals:
+            return
+        rentals.flush_recordset(['bike_id', 'customer_id', 'accessories_ids'])
+        bike_ids, accessory_ids = self._get_rental_sources(SQL("changed.id = ANY(%s)", rentals.ids))
+        # Une source deja notee n'est pas dupliquee (index uniques de la table)
+        for column, ids in (('bike_id', bike_ids), ('accessory_id', accessory_ids)):
+            if ids:
+                self.env.cr.execute(SQL(
+                    "INSERT INTO bike_recommendation_stale (%s) SELECT unnest(%s::int[]) ON CONFLICT DO NOTHING",
+                    SQL.identifier(column), ids,
+                ))
+
+    def _insert_top_scores(self, source_column, target_column, scores_query):
+        """Insere les RECOMMENDATION_DEPTH meilleurs scores de chaque source."""
+        self.env.cr.execute(SQL("""
+            INSERT INTO bike_recommendation (%s, %s, score, create_uid, create_date, write_uid, write_date)
+            SELECT source_id, target_id, score, %s, %s, %s, %s
+              FROM (
+                    SELECT source_id, target_id, score,
+                           row_number() OVER (PARTITION BY source_id ORDER BY score DESC, target_id) AS rank
+                      FROM (%s) scores
+                   ) ranked
+             WHERE rank <= %s
+        """, SQL.identifier(source_column), SQL.identifier(target_column),
+            self.env.uid, self.env.cr.now(), self.env.uid, self.env.cr.now(),
+            scores_query, RECOMMENDATION_DEPTH))
+
+    @api.model
+    def _rebuild_bike_sources(self, bike_ids):
+        if not bike_ids:
+            return
+        self.env.cr.execute(
+            "DELETE FROM bike_recommendation WHERE source_bike_id = ANY(%s)", [bike_ids],
+        )
+        # Velos loues par les memes clients
+        self._insert_top_scores('source_bike_id', 'bike_id', SQL("""
+            SELECT rental.bike_id AS source_id, other.bike_id AS target_id,
+                   count(DISTINCT rental.customer_id) AS score
+              FROM bike_rental rental
+              JOIN bike_rental other ON other.customer_id = rental.customer_id
+                                    AND other.bike_id != rental.bike_id
+             WHERE rental.bike_id = ANY(%s)
+               AND rental.state != 'cancelled'
+               AND other.state != 'cancelled'
+          GROUP BY rental.bike_id, other.bike_id
+        """, bike_ids))
+        # Accessoires loues avec le velo, compatibles avec son type
+        relation, rental_col, accessory_col = self._get_accessory_relation()
+        self._insert_top_scores('source_bike_id', 'accessory_id', SQL("""
+            SELECT rental.bike_id AS source_id, rel.%s AS target_id, count(*) AS score
+              FROM bike_rental rental
+              JOIN %s rel ON rel.%s = rental.id
+              JOIN bike_bike bike ON bike.id = rental.bike_id
+              JOIN bike_accessory accessory ON accessory.id = rel.%s
+             WHERE rental.bike_id = ANY(%s)
+               AND rental.state != 'cancelled'
+               AND COALESCE(accessory.compatible_bike_types, 'all') IN ('all', bike.bike_type)
+          GROUP BY rental.bike_id, rel.%s
+        """, accessory_col, relation, rental_col, accessory_col, bike_ids, accessory_col))
+
+    @api.model
+    def _rebuild_accessory_sources(self, accessory_ids):
+        if not accessory_ids:
+            return
+        self.env.cr.execute(
+            "DELETE FROM bike_recommendation WHERE source_accessory_id = ANY(%s)", [accessory_ids],
+        )
+        # Accessoires pris ensemble sur une meme location
+        relation, rental_col, accessory_col = self._get_accessory_relation()
+        self._insert_top_scores('source_accessory_id', 'accessory_id', SQL("""
+            SELECT rel.%s AS source_id, other.%s AS target_id, count(*) AS score
+              FROM %s rel
+              JOIN %s other ON other.%s = rel.%s AND other.%s != rel.%s
+              JOIN bike_rental rental ON rental.id = rel.%s
+             WHERE rel.%s = ANY(%s)
+               AND rental.state != 'cancelled'
+          GROUP BY rel.%s, other.%s
+        """, accessory_col, accessory_col,
+            relation,
+            relation, rental_col, rental_col, accessory_col, accessory_col,
+            rental_col,
+            accessory_col, accessory_ids,
+            accessory_col, accessory_col))
+
+
+class BikeRecommendationStale(models.Model):
+    _name = 'bike.recommendation.stale'
+    _description = 'Source de recommandations a recalculer'
+    _log_access = False
+
+    bike_id = fields.Many2one('bike.bike', string='Velo', ondelete='cascade')
+    accessory_id = fields.Many2one('bike.accessory', string='Accessoire', ondelete='cascade')
+
+    def init(self):
+        super().init()
+        # Doublons notes avant l'ajout des index uniques
+        self.env.cr.execute("""
+            DELETE FROM bike_recommendation_stale s
+             USING bike_recommendation_stale d
+             WHERE d.id < s.id
+               AND (d.bike_id = s.bike_id OR d.accessory_id = s.accessory_id)
+        """)
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS bike_recommendation_stale_bike_uniq
+                ON bike_recommendation_stale (bike_id) WHERE bike_id IS NOT NULL
+        """)
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS bike_recommendation_stale_accessory_uniq
+                ON bike_recommendation_stale (accessory_id) WHERE accessory_id IS NOT NULL
+        """)
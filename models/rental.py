@@ -1,7 +1,20 @@
-from odoo import models, fields, api
+import logging
+import threading
+
+import psycopg2
+
+from odoo import models, fields, api, tools
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import SQL
 from datetime import timedelta
 
+from .accessory_move import RESERVATION_MOVE_TYPES
+
+_logger = logging.getLogger(__name__)
+
+# Etats qui liberent le velo: ignores par le controle de chevauchement
+RENTAL_FREE_STATES = ('cancelled', 'returned')
+
 
 class BikeRental(models.Model):
     _name = 'bike.rental'
@@ -12,14 +25,16 @@ class BikeRental(models.Model):
     name = fields.Char(string='Reference', required=True, copy=False, readonly=True,
                       default=lambda self: 'Nouveau')
     
-    bike_id = fields.Many2one('bike.bike', string='Velo', required=True, tracking=True,
-                              domain=[('is_for_rent', '=', True), ('state', '=', 'available')])
+    bike_id = fields.Many2one('bike.bike', string='Velo', required=True, tracking=True, index=True,
+                              domain=[('available_between', '=', True)])
     customer_id = fields.Many2one('res.partner', string='Client', required=True, tracking=True)
     contract_id = fields.Many2one('bike.rental.contract', string='Contrat', ondelete='set null')
+    batch_job_id = fields.Many2one('bike.rental.batch.job', string='Traitement en masse', copy=False,
+                                   ondelete='set null', index='btree_not_null')
 
-    date_start = fields.Datetime(string='Date de debut', required=True, tracking=True,
+    date_start = fields.Datetime(string='Date de debut', required=True, tracking=True, index=True,
                                  default=fields.Datetime.now)
-    date_end = fields.Datetime(string='Date de fin prevue', required=True, tracking=True)
+    date_end = fields.Datetime(string='Date de fin prevue', required=True, tracking=True, index=True)
     date_returned = fields.Datetime(string='Date de retour effectif', tracking=True)
 
     duration_type = fields.Selection([
@@ -47,7 +62,7 @@ class BikeRental(models.Model):
         ('returned', 'Retournee'),
         ('cancelled', 'Annulee'),
         ('overdue', 'En retard'),
-    ], string='Statut', default='draft', required=True, tracking=True)
+    ], string='Statut', default='draft', required=True, tracking=True, index=True)
 
     notes = fields.Text(string='Notes')
     bike_condition_start = fields.Text(string='Etat du velo au depart')
@@ -65,12 +80,165 @@ class BikeRental(models.Model):
     invoice_id = fields.Many2one('account.move', string='Facture', readonly=True, copy=False)
     invoice_state = fields.Selection(related='invoice_id.state', string='Statut facture', store=False)
 
+    def init(self):
+        super().init()
+        # Rafraichissement incremental du planning (write_date > curseur)
+        tools.create_index(self.env.cr, 'bike_rental_write_date_index', self._table, ['write_date'])
+        # Garde-fou base de donnees contre les doubles reservations concurrentes.
+        # La contrainte est differee: le controle Python ci-dessous produit le
+        # message lisible, PostgreSQL ne tranche qu'au commit entre deux guichets.
+        cr = self.env.cr
+        cr.execute("SELECT 1 FROM pg_constraint WHERE conname = 'bike_rental_bike_period_excl'")
+        if cr.fetchone():
+            return
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+                cr.execute("""
+                    ALTER TABLE bike_rental
+                    ADD CONSTRAINT bike_rental_bike_period_excl
+                    EXCLUDE USING gist (
+                        bike_id WITH =,
+                        tsrange(LEAST(date_start, date_end), GREATEST(date_start, date_end), '[)') WITH &&
+                    )
+                    WHERE (state NOT IN ('cancelled', 'returned'))
+                    DEFERRABLE INITIALLY DEFERRED
+                """)
+        except psycopg2.Error as e:
+            _logger.warning("Contrainte d'exclusion bike_rental_bike_period_excl non creee: %s", e)
+
     @api.model_create_multi
     def create(self, vals_list):
+        to_number = [vals for vals in vals_list if vals.get('name', 'Nouveau') == 'Nouveau']
+        names = self.env['ir.sequence']._next_by_code_batch('bike.rental', len(to_number))
+        for vals, name in zip(to_number, names):
+            vals['name'] = name or 'Nouveau'
+        self._fill_prices_from_quote(vals_list)
+        rentals = super().create(vals_list)
+        self.env['bike.shop.cache.version']._bump_after_commit(self._name)
+        rentals.filtered('accessories_ids')._sync_accessory_reservations()
+        return rentals
+
+    def write(self, vals):
+        if {'bike_id', 'customer_id', 'accessories_ids'}.intersection(vals):
+            # Les anciennes paires de co-location disparaissent avec l'ecriture
+            self.env['bike.recommendation']._mark_rentals_stale(self)
+        if {'bike_id', 'date_start', 'date_end', 'state'}.intersection(vals):
+            # La disponibilite affichee sur le catalogue web en depend
+            self.env['bike.shop.cache.version']._bump_after_commit(self._name)
+        res = super().write(vals)
+        if 'state' in vals or 'accessories_ids' in vals:
+            self._sync_accessory_reservations()
+        return res
+
+    def unlink(self):
+        self._sync_accessory_reservations(release=True)
+        self.env['bike.recommendation']._mark_rentals_stale(self)
+        self.env['bike.shop.cache.version']._bump_after_commit(self._name)
+        return super().unlink()
+
+    def _sync_accessory_reservations(self, release=False):
+        """Aligne les reservations d'accessoires du registre sur les locations.
+
+        Chaque location active reserve une unite de chacun de ses accessoires;
+        une location retournee, annulee ou supprimee (``release``) les libere.
+        Seuls les ecarts avec le registre sont appliques, en une mise a jour
+        atomique du stock.
+        """
+        if not self:
+            return
+        reserved = {}
+        for rental, accessory, quantity in self.env['bike.accessory.move']._read_group(
+            [('rental_id', 'in', self.ids), ('move_type', 'in', RESERVATION_MOVE_TYPES)],
+            ['rental_id', 'accessory_id'], ['quantity:sum'],
+        ):
+            reserved.setdefault(rental.id, {})[accessory.id] = quantity
+        moves = []
+        for rental in self:
+            current = reserved.get(rental.id, {})
+            wanted = set() if release or rental.state in RENTAL_FREE_STATES else set(rental.accessories_ids.ids)
+            for accessory_id in wanted | set(current):
+                delta = (1 if accessory_id in wanted else 0) - current.get(accessory_id, 0)
+                if delta:
+                    moves.append({
+                        'accessory_id': accessory_id,
+                        'rental_id': rental.id,
+                        'move_type': 'reserve' if delta > 0 else 'release',
+                        'quantity': delta,
+                    })
+        self.env['bike.accessory']._apply_stock_moves(moves)
+
+    @api.model
+    def _fill_prices_from_quote(self, vals_list):
+        """Complete prix unitaire et caution absents (import, RPC) via le moteur de devis."""
+        groups = {}
         for vals in vals_list:
-            if vals.get('name', 'Nouveau') == 'Nouveau':
-                vals['name'] = self.env['ir.sequence'].next_by_code('bike.rental') or 'Nouveau'
-        return super().create(vals_list)
+            if vals.get('bike_id') and ('unit_price' not in vals or 'deposit' not in vals):
+                key = (
+                    vals.get('date_start') or fields.Datetime.now(),
+                    vals.get('date_end'),
+                    vals.get('duration_type') or 'day',
+                )
+                groups.setdefault(key, []).append(vals)
+        Pricing = self.env['bike.rental.pricing']
+        for (date_start, date_end, duration_type), group in groups.items():
+            bikes = self.env['bike.bike'].browse({vals['bike_id'] for vals in group})
+            quotes = Pricing.quote_many(bikes, date_start, date_end, duration_type)
+            for vals in group:
+                quote = quotes[vals['bike_id']]
+                vals.setdefault('unit_price', quote['unit_price'])
+                vals.setdefault('deposit', quote['deposit'])
+
+    @api.model
+    def _create_batch(self, vals_list):
+        """Creation groupee de locations: un INSERT, un controle de disponibilite,
+        sans message de creation ni abonnement par location."""
+        return self.with_context(
+            tracking_disable=True,
+            mail_create_nolog=True,
+            mail_create_nosubscribe=True,
+        ).create(vals_list)
+
+    @api.model
+    def _prepare_batch_vals(self, source, line, contract=False, accessories=None, batch_job=False):
+        """Valeurs d'une location creee en masse, pour la societe de l'environnement.
+
+        ``source`` (assistant ou traitement en arriere-plan) porte le client,
+        la periode et les notes; ``line`` le velo et ses prix. ``batch_job``
+        rattache la location au traitement qui la cree (reprise idempotente).
+        """
+        rental_vals = {
+            'bike_id': line.bike_id.id,
+            'customer_id': source.customer_id.id,
+            'date_start': source.date_start,
+            'date_end': source.date_end,
+            'duration_type': source.duration_type,
+            'unit_price': line.unit_price,
+            'deposit': line.deposit,
+            'notes': source.notes,
+            'company_id': self.env.company.id,
+        }
+        if contract:
+            rental_vals['contract_id'] = contract.id
+        if accessories:
+            rental_vals['accessories_ids'] = [(6, 0, accessories.ids)]
+        if batch_job:
+            rental_vals['batch_job_id'] = batch_job.id
+        return rental_vals
+
+    @api.model
+    def _check_period_constraint(self):
+        """Controle tout de suite la contrainte d'exclusion differee.
+
+        Sans cela, un chevauchement ne serait leve qu'au commit, hors de tout
+        point de sauvegarde de l'appelant.
+        """
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute("SELECT 1 FROM pg_constraint WHERE conname = 'bike_rental_bike_period_excl'")
+        if cr.fetchone():
+            cr.execute("SET CONSTRAINTS bike_rental_bike_period_excl IMMEDIATE")
+            cr.execute("SET CONSTRAINTS bike_rental_bike_period_excl DEFERRED")
 
     @api.depends('date_start', 'date_end', 'duration_type')
     def _compute_duration(self):
@@ -110,7 +278,7 @@ class BikeRental(models.Model):
     def _compute_is_overdue(self):
         now = fields.Datetime.now()
         for rental in self:
-            if rental.state in ['ongoing', 'confirmed'] and rental.date_end:
+            if rental.state in ['ongoing', 'confirmed', 'overdue'] and rental.date_end:
                 if now > rental.date_end:
                     rental.is_overdue = True
                     delta = now - rental.date_end
@@ -139,12 +307,14 @@ class BikeRental(models.Model):
             else:
                 rental.late_fee = 0
 
-    @api.onchange('bike_id', 'duration_type')
+    @api.onchange('bike_id', 'duration_type', 'date_start', 'date_end')
     def _onchange_bike_pricing(self):
         if self.bike_id and self.duration_type:
-            price_field = f'rental_price_{self.duration_type}'
-            if hasattr(self.bike_id, price_field):
-                self.unit_price = getattr(self.bike_id, price_field) or 0
+            quote = self.env['bike.rental.pricing'].quote_many(
+                self.bike_id, self.date_start, self.date_end, self.duration_type,
+            )[self.bike_id._origin.id or self.bike_id.id]
+            self.unit_price = quote['unit_price']
+            self.deposit = quote['deposit']
 
     @api.constrains('date_start', 'date_end')
     def _check_dates(self):
@@ -155,61 +325,132 @@ class BikeRental(models.Model):
 
     @api.constrains('bike_id', 'date_start', 'date_end', 'state')
     def _check_bike_availability(self):
-        for rental in self:
-            if rental.state not in ['cancelled', 'returned']:
-                overlapping = self.search([
-                    ('id', '!=', rental.id),
-                    ('bike_id', '=', rental.bike_id.id),
-                    ('state', 'not in', ['cancelled', 'returned']),
-                    ('date_start', '<', rental.date_end),
-                    ('date_end', '>', rental.date_start),
-                ])
-                if overlapping:
-                    raise ValidationError(
-                        f"Le velo {rental.bike_id.name} est deja reserve pour cette periode."
-                    )
+        rentals = self.filtered(
+            lambda r: r.state not in RENTAL_FREE_STATES and r.bike_id and r.date_start and r.date_end
+        )
+        conflicts = self._get_bike_conflicts([
+            (rental.bike_id.id, rental.date_start, rental.date_end, rental.id)
+            for rental in rentals
+        ])
+        if conflicts:
+            self._raise_bike_conflicts(conflicts)
+
+    @api.model
+    def _get_bike_conflicts(self, intervals):
+        """Retourne les ids des velos deja reserves sur les periodes demandees.
+
+        ``intervals`` est une liste de tuples ``(bike_id, date_start, date_end, rental_id)``
+        ou ``rental_id`` est la location a ignorer (ou False). Une seule requete
+        est executee quel que soit le nombre de periodes.
+        """
+        if not intervals:
+            return set()
+        self.flush_model(['bike_id', 'date_start', 'date_end', 'state'])
+        values = ', '.join(['(%s, %s::timestamp, %s::timestamp, %s)'] * len(intervals))
+        params = []
+        for bike_id, date_start, date_end, rental_id in intervals:
+            params += [bike_id, date_start, date_end, rental_id or 0]
+        self.env.cr.execute(f"""
+            SELECT DISTINCT req.bike_id
+              FROM (VALUES {values}) AS req(bike_id, date_start, date_end, rental_id)
+              JOIN bike_rental r ON r.bike_id = req.bike_id
+             WHERE r.id != req.rental_id
+               AND r.state NOT IN %s
+               AND r.date_start < req.date_end
+               AND r.date_end > req.date_start
+        """, params + [RENTAL_FREE_STATES])
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def _raise_bike_conflicts(self, bike_ids, period_label="cette periode"):
+        bikes = self.env['bike.bike'].browse(sorted(bike_ids))
+        names = ', '.join(bikes.mapped('name'))
+        raise ValidationError(f"Les velos suivants sont deja reserves pour {period_label}: {names}")
+
+    @api.model
+    def _get_timeline(self, date_from, date_to, bike_ids=None, since=None):
+        """Intervalles de reservation par velo sur une fenetre, en tableaux compacts.
+
+        Une seule requete fenetree sur date_start/date_end. Avec ``since``, les
+        locations modifiees depuis ce curseur sont renvoyees quelles que soient
+        leurs dates (annulees comprises): le planning retire celles qui sont
+        sorties de sa fenetre ou ont ete annulees.
+        """
+        self.flush_model(['bike_id', 'customer_id', 'date_start', 'date_end', 'state', 'company_id'])
+        where = ["r.company_id IN %s"]
+        params = [tuple(self.env.companies.ids)]
+        if bike_ids is not None:
+            if not bike_ids:
+                return []
+            where.append("r.bike_id IN %s")
+            params.append(tuple(bike_ids))
+        if since:
+            where.append("r.write_date > %s")
+            params.append(since)
+        else:
+            where += ["r.date_start < %s", "r.date_end > %s", "r.state != 'cancelled'"]
+            params += [date_to, date_from]
+        self.env.cr.execute(f"""
+            SELECT r.id, r.bike_id, r.date_start, r.date_end, r.state, r.name, p.name
+              FROM bike_rental r
+              LEFT JOIN res_partner p ON p.id = r.customer_id
+             WHERE {' AND '.join(where)}
+             ORDER BY r.bike_id, r.date_start
+        """, params)
+        return [
+            [rental_id, bike_id, fields.Datetime.to_string(start), fields.Datetime.to_string(end),
+             state, name, customer]
+            for rental_id, bike_id, start, end, state, name, customer in self.env.cr.fetchall()
+        ]
+
+    def _check_transition(self, allowed_states, message):
+        """Valide l'ensemble des locations avant toute ecriture."""
+        invalid = self.filtered(lambda r: r.state not in allowed_states)
+        if invalid:
+            raise UserError(f"{message} ({', '.join(invalid.mapped('name'))})")
 
     def action_confirm(self):
-        for rental in self:
-            if rental.state != 'draft':
-                raise UserError("Seule une location en brouillon peut etre confirmee.")
-            rental.write({'state': 'confirmed'})
-            rental.bike_id.write({'state': 'reserved'})
+        self._check_transition(['draft'], "Seule une location en brouillon peut etre confirmee.")
+        self.write({'state': 'confirmed'})
+        self.bike_id.write({'state': 'reserved'})
 
     def action_start(self):
-        for rental in self:
-            if rental.state != 'confirmed':
-                raise UserError("Seule une location confirmee peut demarrer.")
-            rental.write({
-                'state': 'ongoing',
-                'date_start': fields.Datetime.now(),
-            })
-            rental.bike_id.write({'state': 'rented'})
+        self._check_transition(['confirmed'], "Seule une location confirmee peut demarrer.")
+        self.write({
+            'state': 'ongoing',
+            'date_start': fields.Datetime.now(),
+        })
+        self.bike_id.write({'state': 'rented'})
 
     def action_return(self):
-        for rental in self:
-            if rental.state != 'ongoing':
-                raise UserError("Seule une location en cours peut etre retournee.")
-            rental.write({
-                'state': 'returned',
-                'date_returned': fields.Datetime.now(),
-            })
-            rental.bike_id.write({'state': 'available'})
+        self._check_transition(['ongoing', 'overdue'], "Seule une location en cours peut etre retournee.")
+        self.write({
+            'state': 'returned',
+            'date_returned': fields.Datetime.now(),
+        })
+        self.bike_id.write({'state': 'available'})
 
     def action_cancel(self):
-        for rental in self:
-            if rental.state in ['returned']:
-                raise UserError("Impossible d'annuler une location deja retournee.")
-            old_state = rental.state
-            rental.write({'state': 'cancelled'})
-            if old_state in ['confirmed', 'ongoing']:
-                rental.bike_id.write({'state': 'available'})
+        self._check_transition(
+            ['draft', 'confirmed', 'ongoing', 'overdue', 'cancelled'],
+            "Impossible d'annuler une location deja retournee.",
+        )
+        bikes_to_release = self.filtered(lambda r: r.state in ['confirmed', 'ongoing', 'overdue']).bike_id
+        self.write({'state': 'cancelled'})
+        bikes_to_release.write({'state': 'available'})
+
+    def action_checkout(self):
+        """Depart groupe: confirme les brouillons puis demarre toutes les locations."""
+        self.filtered(lambda r: r.state == 'draft').action_confirm()
+        self.action_start()
+
+    def action_checkin(self):
+        """Retour groupe des velos."""
+        self.action_return()
 
     def action_return_deposit(self):
-        for rental in self:
-            if rental.state != 'returned':
-                raise UserError("La caution ne peut etre rendue qu'apres le retour du velo.")
-            rental.write({'deposit_returned': True})
+        self._check_transition(['returned'], "La caution ne peut etre rendue qu'apres le retour du velo.")
+        self.write({'deposit_returned': True})
 
     def action_extend_rental(self):
         self.ensure_one()
@@ -223,18 +464,49 @@ class BikeRental(models.Model):
         }
 
     @api.model
-    def _cron_check_overdue(self):
+    def _cron_check_overdue(self, chunk_size=1000):
+        """Rafraichit les champs de retard et bascule les locations en retard.
+
+        Seules les locations dont les valeurs stockees sont perimees sont
+        traitees, par lots de ``chunk_size`` avec un commit par lot.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
         now = fields.Datetime.now()
-        overdue_rentals = self.search([
-            ('state', '=', 'ongoing'),
-            ('date_end', '<', now),
-        ])
-        for rental in overdue_rentals:
-            rental.write({'state': 'overdue'})
-            rental.message_post(
-                body=f"La location est en retard depuis {rental.overdue_days} jour(s).",
-                subject="Location en retard"
-            )
+        self.flush_model(['state', 'date_end', 'is_overdue', 'overdue_days'])
+        self.env.cr.execute("""
+            SELECT id
+              FROM bike_rental
+             WHERE state IN ('confirmed', 'ongoing', 'overdue')
+               AND (
+                    (date_end < %(now)s AND (
+                        state = 'ongoing'
+                        OR is_overdue IS NOT TRUE
+                        OR overdue_days IS DISTINCT FROM EXTRACT(DAY FROM %(now)s - date_end)::int
+                    ))
+                    OR (date_end >= %(now)s AND is_overdue)
+               )
+          ORDER BY id
+        """, {'now': now})
+        rental_ids = [row[0] for row in self.env.cr.fetchall()]
+
+        for start in range(0, len(rental_ids), chunk_size):
+            rentals = self.browse(rental_ids[start:start + chunk_size])
+            to_flag = rentals.filtered(lambda r: r.state == 'ongoing' and r.date_end < now)
+            to_flag.write({'state': 'overdue'})
+            for field_name in ('is_overdue', 'overdue_days', 'late_fee'):
+                self.env.add_to_compute(self._fields[field_name], rentals - to_flag)
+            rentals.flush_recordset()
+            if to_flag:
+                to_flag._message_log_batch(
+                    bodies={
+                        rental.id: f"La location est en retard depuis {rental.overdue_days} jour(s)."
+                        for rental in to_flag
+                    },
+                    subject="Location en retard",
+                )
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
 
     def action_create_invoice(self):
         self.ensure_one()
@@ -245,77 +517,153 @@ class BikeRental(models.Model):
         if self.state == 'draft':
             raise UserError("Impossible de facturer une location en brouillon.")
         
-        income_account = self.env['account.account'].search([
+        invoice = self._create_invoices(group_by='rental')
+        if not invoice:
+            raise UserError("Cette location ne peut pas etre facturee (location annulee).")
+        
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Facture',
+            'res_model': 'account.move',
+            'res_id': invoice.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    @api.model
+    def _get_income_account(self, company):
+        Account = self.env['account.account'].with_company(company)
+        company_domain = Account._check_company_domain(company)
+        
+        income_account = Account.search(company_domain + [
             ('account_type', '=', 'income'),
         ], limit=1)
         
         if not income_account:
-            income_account = self.env['account.account'].search([
+            income_account = Account.search(company_domain + [
                 ('account_type', 'in', ['income', 'income_other']),
             ], limit=1)
         
         if not income_account:
-            income_account = self.env['account.account'].search([
+            income_account = Account.search(company_domain + [
                 ('code', '=like', '7%'),
             ], limit=1)
         
         if not income_account:
             raise UserError("Aucun compte de revenus trouve. Veuillez configurer la comptabilite.")
-        
-        invoice_lines = []
-        
+        return income_account
+
+    def _get_invoiceable(self):
+        return self.filtered(lambda r: not r.invoice_id and r.state not in ['draft', 'cancelled'])
+
+    def _group_for_invoicing(self, group_by='customer'):
+        """Regroupe les locations par facture a emettre.
+
+        ``group_by``: 'customer' (une facture par client), 'contract' (par client
+        et contrat) ou 'rental' (une facture par location).
+        """
+        groups = {}
+        for rental in self:
+            if group_by == 'rental':
+                key = (rental.company_id, rental.customer_id, rental.id)
+            elif group_by == 'contract':
+                key = (rental.company_id, rental.customer_id, rental.contract_id)
+            else:
+                key = (rental.company_id, rental.customer_id)
+            groups.setdefault(key, []).append(rental.id)
+        return {key: self.browse(ids) for key, ids in groups.items()}
+
+    def _prepare_invoice_lines(self, income_account):
         duration_labels = {
             'hour': 'heure(s)',
             'day': 'jour(s)',
             'week': 'semaine(s)',
             'month': 'mois',
         }
-        duration_label = duration_labels.get(self.duration_type, '')
-        
-        invoice_lines.append((0, 0, {
-            'name': f"Location velo: {self.bike_id.name} - {self.duration} {duration_label}",
-            'quantity': self.duration,
-            'price_unit': self.unit_price,
-            'account_id': income_account.id,
-        }))
-        
-        if self.late_fee > 0:
-            invoice_lines.append((0, 0, {
-                'name': f"Frais de retard ({self.overdue_days} jour(s))",
-                'quantity': 1,
-                'price_unit': self.late_fee,
-                'account_id': income_account.id,
-            }))
-        
-        for accessory in self.accessories_ids:
+        invoice_lines = []
+        for rental in self:
+            prefix = f"{rental.name} - " if len(self) > 1 else ""
+            duration_label = duration_labels.get(rental.duration_type, '')
+            
             invoice_lines.append((0, 0, {
-                'name': f"Accessoire: {accessory.name}",
-                'quantity': 1,
-                'price_unit': 0,
+                'name': f"{prefix}Location velo: {rental.bike_id.name} - {rental.duration} {duration_label}",
+                'quantity': rental.duration,
+                'price_unit': rental.unit_price,
                 'account_id': income_account.id,
             }))
-        
-        invoice_vals = {
+            
+            if rental.late_fee > 0:
+                invoice_lines.append((0, 0, {
+                    'name': f"{prefix}Frais de retard ({rental.overdue_days} jour(s))",
+                    'quantity': 1,
+                    'price_unit': rental.late_fee,
+                    'account_id': income_account.id,
+                }))
+            
+            for accessory in rental.accessories_ids:
+                invoice_lines.append((0, 0, {
+                    'name': f"{prefix}Accessoire: {accessory.name}",
+                    'quantity': 1,
+                    'price_unit': 0,
+                    'account_id': income_account.id,
+                }))
+        return invoice_lines
+
+    def _prepare_invoice_vals(self, income_account):
+        periods = [
+            f"Location du {rental.date_start.strftime('%d/%m/%Y')} au {rental.date_end.strftime('%d/%m/%Y')}"
+            + (f" ({rental.name})" if len(self) > 1 else "")
+            for rental in self
+        ]
+        return {
             'move_type': 'out_invoice',
-            'partner_id': self.customer_id.id,
+            'partner_id': self[0].customer_id.id,
             'invoice_date': fields.Date.today(),
-            'invoice_origin': self.name,
-            'narration': f"Location du {self.date_start.strftime('%d/%m/%Y')} au {self.date_end.strftime('%d/%m/%Y')}",
-            'invoice_line_ids': invoice_lines,
-        }
-        
-        invoice = self.env['account.move'].create(invoice_vals)
-        self.write({'invoice_id': invoice.id})
-        
-        return {
-            'type': 'ir.actions.act_window',
-            'name': 'Facture',
-            'res_model': 'account.move',
-            'res_id': invoice.id,
-            'view_mode': 'form',
-            'target': 'current',
+            'invoice_origin': ', '.join(self.mapped('name')),
+            'narration': '<br/>'.join(periods),
+            'invoice_line_ids': self._prepare_invoice_lines(income_account),
         }
 
+    def _create_invoices(self, group_by='customer'):
+        """Cree les factures des locations en un ``create()`` par societe.
+
+        Le compte de revenus n'est resolu qu'une fois par societe.
+        """
+        groups = self._get_invoiceable()._group_for_invoicing(group_by)
+        by_company = {}
+        for key, rentals in groups.items():
+            by_company.setdefault(key[0], []).append(rentals)
+
+        invoices = self.env['account.move']
+        pairs = []
+        for company, rental_groups in by_company.items():
+            income_account = self._get_income_account(company)
+            moves = self.env['account.move'].with_company(company).create([
+                rentals._prepare_invoice_vals(income_account) for rentals in rental_groups
+            ])
+            pairs += [(rental.id, move.id) for move, rentals in zip(moves, rental_groups) for rental in rentals]
+            invoices |= moves
+        if pairs:
+            self._set_invoice_ids(pairs)
+        return invoices
+
+    def _set_invoice_ids(self, pairs):
+        """Rattache les factures aux locations, en une requete pour tout le lot."""
+        self.flush_model(['invoice_id'])
+        self.env.cr.execute(SQL(
+            """
+            UPDATE bike_rental r
+               SET invoice_id = v.invoice_id, write_uid = %s, write_date = %s
+              FROM (VALUES %s) AS v(id, invoice_id)
+             WHERE r.id = v.id
+            """,
+            self.env.uid, self.env.cr.now(),
+            SQL(", ").join(SQL("(%s, %s)", rental_id, invoice_id) for rental_id, invoice_id in pairs),
+        ))
+        self.browse([rental_id for rental_id, _invoice_id in pairs]).invalidate_recordset(
+            ['invoice_id', 'write_uid', 'write_date'],
+        )
+
     def action_view_invoice(self):
         self.ensure_one()
         if not self.invoice_id:
@@ -0,0 +1,141 @@
+import logging
+import threading
+
+import psycopg2
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError, ValidationError
+
+_logger = logging.getLogger(__name__)
+
+
+class BikeRentalBatchJob(models.Model):
+    _name = 'bike.rental.batch.job'
+    _description = 'Traitement en masse de locations'
+    _inherit = ['mail.thread']
+    _order = 'id desc'
+
+    name = fields.Char(string='Nom', required=True)
+    customer_id = fields.Many2one('res.partner', string='Client', required=True)
+    contract_id = fields.Many2one('bike.rental.contract', string='Contrat', ondelete='set null')
+
+    date_start = fields.Datetime(string='Date de debut', required=True)
+    date_end = fields.Datetime(string='Date de fin', required=True)
+    duration_type = fields.Selection([
+        ('hour', 'Heure'),
+        ('day', 'Jour'),
+        ('week', 'Semaine'),
+        ('month', 'Mois'),
+    ], string='Type de duree', required=True, default='day')
+    accessory_ids = fields.Many2many('bike.accessory', string='Accessoires')
+    notes = fields.Text(string='Notes')
+
+    line_ids = fields.One2many('bike.rental.batch.job.line', 'job_id', string='Velos a louer')
+    rental_ids = fields.One2many('bike.rental', 'batch_job_id', string='Locations creees')
+    total_count = fields.Integer(string='Nombre de velos', compute='_compute_progress')
+    done_count = fields.Integer(string='Locations creees', compute='_compute_progress')
+
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Termine'),
+        ('failed', 'En echec'),
+    ], string='Statut', default='pending', required=True, tracking=True)
+    error_message = fields.Text(string='Erreur', readonly=True)
+
+    company_id = fields.Many2one('res.company', string='Societe', default=lambda self: self.env.company)
+
+    @api.depends('line_ids', 'rental_ids')
+    def _compute_progress(self):
+        line_counts = dict(self.env['bike.rental.batch.job.line']._read_group(
+            [('job_id', 'in', self.ids)], ['job_id'], ['__count'],
+        ))
+        rental_counts = dict(self.env['bike.rental']._read_group(
+            [('batch_job_id', 'in', self.ids)], ['batch_job_id'], ['__count'],
+        ))
+        for job in self:
+            job.total_count = line_counts.get(job, 0)
+            job.done_count = rental_counts.get(job, 0)
+
+    @api.model
+    def _get_async_threshold(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        return int(ICP.get_param('bike_shop.rental_async_threshold', 100))
+
+    @api.model
+    def _get_chunk_size(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        return int(ICP.get_param('bike_shop.rental_async_chunk_size', 50))
+
+    def _trigger_processing(self):
+        self.env.ref('bike_shop.ir_cron_rental_batch_jobs')._trigger()
+
+    def action_retry(self):
+        self.filtered(lambda j: j.state == 'failed').write({'state': 'pending', 'error_message': False})
+        self._trigger_processing()
+
+    @api.model
+    def _cron_process_jobs(self):
+        # Les jobs 'running' sont repris: un worker a pu etre tue en cours de route
+        for job in self.search([('state', 'in', ['pending', 'running'])], order='id'):
+            job._process()
+
+    def _process(self):
+        """Cree les locations restantes par lots, avec un commit par lot.
+
+        Relancer un job est sans risque: les velos ayant deja une location
+        rattachee au job sont ignores.
+        """
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        chunk_size = self._get_chunk_size()
+        # Le cron tourne en root: locations et numeros dans la societe du job
+        Rental = self.env['bike.rental'].with_company(self.company_id)
+
+        self.state = 'running'
+        done_bikes = self.rental_ids.bike_id
+        lines = self.line_ids.filtered(lambda l: l.bike_id not in done_bikes)
+        for start in range(0, len(lines), chunk_size):
+            chunk = lines[start:start + chunk_size]
+            try:
+                with self.env.cr.savepoint():
+                    Rental._create_batch([
+                        Rental._prepare_batch_vals(self, line, self.contract_id, self.accessory_ids, batch_job=self)
+                        for line in chunk
+                    ])
+                    Rental._check_period_constraint()
+                self.invalidate_recordset(['rental_ids', 'done_count'])
+            except (UserError, ValidationError, psycopg2.IntegrityError) as e:
+                self.write({'state': 'failed', 'error_message': str(e)})
+                self._post_progress(f"Echec de la creation des locations: {e}", subject="Locations en echec")
+                if auto_commit:
+                    self.env.cr.commit()
+                return
+            self._post_progress(f"Progression: {self.done_count}/{self.total_count} location(s) creee(s).")
+            if auto_commit:
+                self.env.cr.commit()
+
+        self.state = 'done'
+        self._post_progress(
+            f"{self.done_count} location(s) creee(s): {', '.join(self.rental_ids.mapped('name'))}",
+            subject="Locations creees",
+        )
+        if auto_commit:
+            self.env.cr.commit()
+
+    def _post_progress(self, body, subject="Creation des locations"):
+        target = self.contract_id or self
+        target.message_post(body=body, subject=subject)
+
+
+class BikeRentalBatchJobLine(models.Model):
+    _name = 'bike.rental.batch.job.line'
+    _description = 'Ligne de traitement en masse de locations'
+
+    job_id = fields.Many2one('bike.rental.batch.job', string='Traitement', required=True,
+                             ondelete='cascade', index=True)
+    bike_id = fields.Many2one('bike.bike', string='Velo', required=True)
+    unit_price = fields.Monetary(string='Prix unitaire', currency_field='currency_id')
+    deposit = fields.Monetary(string='Caution', currency_field='currency_id')
+    currency_id = fields.Many2one('res.currency', string='Devise',
+                                  default=lambda self: self.env.company.currency_id)
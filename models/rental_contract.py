@@ -26,7 +26,7 @@ class BikeRentalContract(models.Model):
     ], string='Type de contrat', required=True, default='short', tracking=True)
 
     rental_ids = fields.One2many('bike.rental', 'contract_id', string='Locations')
-    rental_count = fields.Integer(string='Nombre de locations', compute='_compute_rental_count')
+    rental_count = fields.Integer(string='Nombre de locations', compute='_compute_totals', store=True)
 
     total_amount = fields.Monetary(string='Montant total', compute='_compute_totals', store=True,
                                    currency_field='currency_id')
@@ -47,7 +47,7 @@ class BikeRentalContract(models.Model):
     ], string='Statut', default='draft', required=True, tracking=True)
 
     discount_percent = fields.Float(string='Remise (%)', default=0)
-    discount_amount = fields.Monetary(string='Montant remise', compute='_compute_discount',
+    discount_amount = fields.Monetary(string='Montant remise', compute='_compute_totals', store=True,
                                       currency_field='currency_id')
 
     terms_accepted = fields.Boolean(string='Conditions acceptees', tracking=True)
@@ -70,24 +70,39 @@ class BikeRentalContract(models.Model):
                 vals['name'] = self.env['ir.sequence'].next_by_code('bike.rental.contract') or 'Nouveau'
         return super().create(vals_list)
 
-    @api.depends('rental_ids')
-    def _compute_rental_count(self):
-        for contract in self:
-            contract.rental_count = len(contract.rental_ids)
+    def _get_rental_aggregates(self):
+        """Nombre de locations, total et cautions par contrat.
+
+        Une seule requete groupee pour les contrats enregistres; les contrats en
+        cours d'edition (onchange) sont agreges en memoire.
+        """
+        stored = self.filtered('id')
+        aggregates = {
+            contract.id: (count, total or 0.0, deposit or 0.0)
+            for contract, count, total, deposit in self.env['bike.rental']._read_group(
+                [('contract_id', 'in', stored.ids)],
+                ['contract_id'],
+                ['__count', 'total_price:sum', 'deposit:sum'],
+            )
+        } if stored else {}
+        for contract in self - stored:
+            rentals = contract.rental_ids
+            aggregates[contract.id] = (
+                len(rentals), sum(rentals.mapped('total_price')), sum(rentals.mapped('deposit')),
+            )
+        return aggregates
 
     @api.depends('rental_ids.total_price', 'rental_ids.deposit', 'discount_percent')
     def _compute_totals(self):
+        # Compteur, remise, total et cautions tires d'une seule agregation
+        aggregates = self._get_rental_aggregates()
         for contract in self:
-            subtotal = sum(contract.rental_ids.mapped('total_price'))
+            count, subtotal, deposit = aggregates.get(contract.id, (0, 0.0, 0.0))
             discount = subtotal * contract.discount_percent / 100
+            contract.rental_count = count
+            contract.discount_amount = discount
             contract.total_amount = subtotal - discount
-            contract.total_deposit = sum(contract.rental_ids.mapped('deposit'))
-
-    @api.depends('discount_percent', 'rental_ids.total_price')
-    def _compute_discount(self):
-        for contract in self:
-            subtotal = sum(contract.rental_ids.mapped('total_price'))
-            contract.discount_amount = subtotal * contract.discount_percent / 100
+            contract.total_deposit = deposit
 
     @api.depends('total_amount', 'amount_paid')
     def _compute_balance(self):
@@ -121,33 +136,23 @@ class BikeRentalContract(models.Model):
                 self.date_end = self.date_start + timedelta(days=365)
 
     def action_confirm(self):
-        for contract in self:
-            if not contract.terms_accepted:
-                raise ValidationError("Veuillez accepter les conditions generales.")
-            if not contract.rental_ids:
-                raise ValidationError("Le contrat doit contenir au moins une location.")
-            contract.write({'state': 'confirmed'})
-            for rental in contract.rental_ids:
-                if rental.state == 'draft':
-                    rental.action_confirm()
+        if self.filtered(lambda c: not c.terms_accepted):
+            raise ValidationError("Veuillez accepter les conditions generales.")
+        if self.filtered(lambda c: not c.rental_ids):
+            raise ValidationError("Le contrat doit contenir au moins une location.")
+        self.write({'state': 'confirmed'})
+        self.rental_ids.filtered(lambda r: r.state == 'draft').action_confirm()
 
     def action_activate(self):
-        for contract in self:
-            contract.write({'state': 'active'})
-            for rental in contract.rental_ids:
-                if rental.state == 'confirmed':
-                    rental.action_start()
+        self.write({'state': 'active'})
+        self.rental_ids.filtered(lambda r: r.state == 'confirmed').action_start()
 
     def action_done(self):
-        for contract in self:
-            contract.write({'state': 'done'})
+        self.write({'state': 'done'})
 
     def action_cancel(self):
-        for contract in self:
-            contract.write({'state': 'cancelled'})
-            for rental in contract.rental_ids:
-                if rental.state not in ['returned', 'cancelled']:
-                    rental.action_cancel()
+        self.write({'state': 'cancelled'})
+        self.rental_ids.filtered(lambda r: r.state not in ['returned', 'cancelled']).action_cancel()
 
     def action_view_rentals(self):
         self.ensure_one()
@@ -1,4 +1,23 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+
+from .cache_version import POSTCOMMIT_KEY
+
+# Mois (1-12) rattaches aux saisons de la grille tarifaire
+HIGH_SEASON_MONTHS = (6, 7, 8)
+LOW_SEASON_MONTHS = (11, 12, 1, 2)
+
+# Nombre d'heures par unite de duree
+DURATION_HOURS = {
+    'hour': 1,
+    'day': 24,
+    'week': 168,
+    'month': 720,
+}
+
+# Compteur de version des tables tarifaires en cache (bike.shop.cache.version)
+PRICING_CACHE = 'bike.rental.pricing'
+
+BIKE_PRICE_FIELDS = ['rental_price_hour', 'rental_price_day', 'rental_price_week', 'rental_price_month']
 
 
 class RentalPricing(models.Model):
@@ -61,17 +80,241 @@ class RentalPricing(models.Model):
             season_label = season_labels.get(record.season, '')
             record.name = f"{bike_label} - {duration_label} ({season_label})"
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._bump_pricing_version()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self._bump_pricing_version()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._bump_pricing_version()
+        return res
+
+    @api.model
+    def _get_pricing_version(self):
+        return self.env['bike.shop.cache.version']._get_version(PRICING_CACHE)
+
+    @api.model
+    def _bump_pricing_version(self):
+        """Invalide les tables tarifaires en cache (grille et prix des velos)."""
+        self.env['bike.shop.cache.version']._bump(PRICING_CACHE)
+
+    @api.model
+    def _get_pricing_grid(self, company_id, version=None):
+        if version is None:
+            version = self._get_pricing_version()
+        return self._get_cached_pricing_grid(company_id, version)
+
+    @api.model
+    def _get_bike_price_table(self, company_id, version=None):
+        if PRICING_CACHE in self.env.cr.postcommit.data.get(POSTCOMMIT_KEY, ()):
+            # Prix de velos modifies dans cette transaction: le compteur ne sera
+            # incremente qu'au commit, la table en cache est donc perimee ici
+            return self._read_bike_price_table(company_id)
+        if version is None:
+            version = self._get_pricing_version()
+        return self._get_cached_bike_price_table(company_id, version)
+
+    @api.model
+    def _get_pricing_matrix(self, company_id):
+        return self._get_cached_pricing_matrix(company_id, self._get_pricing_version())
+
+    @api.model
+    @tools.ormcache('company_id', 'version')
+    def _get_cached_pricing_grid(self, company_id, version):
+        """Grille tarifaire d'une societe, lue en une requete et partagee par le worker.
+
+        (bike_type, duration_type, season) -> (prix, caution, duree min, majoration week-end)
+        """
+        grid = {}
+        rows = self.sudo().search_read(
+            [('company_id', 'in', [company_id, False])],
+            ['bike_type', 'duration_type', 'season', 'price', 'deposit_amount', 'min_duration',
+             'weekend_surcharge', 'company_id'],
+            order='company_id desc',
+        )
+        for row in rows:
+            key = (row['bike_type'], row['duration_type'], row['season'] or 'all')
+            # Les lignes propres a la societe priment sur les lignes partagees
+            if key not in grid or row['company_id']:
+                grid[key] = (row['price'], row['deposit_amount'], row['min_duration'], row['weekend_surcharge'])
+        return grid
+
+    @api.model
+    @tools.ormcache('company_id', 'version')
+    def _get_cached_bike_price_table(self, company_id, version):
+        return self._read_bike_price_table(company_id)
+
+    @api.model
+    def _read_bike_price_table(self, company_id):
+        """Prix de location propres aux velos: bike_id -> (bike_type, {duration_type: prix})."""
+        bikes = {}
+        bike_rows = self.env['bike.bike'].sudo().with_context(active_test=False).search_read(
+            [('company_id', 'in', [company_id, False])],
+            ['bike_type'] + BIKE_PRICE_FIELDS,
+        )
+        for row in bike_rows:
+            bikes[row['id']] = (row['bike_type'], {
+                duration_type: row[f'rental_price_{duration_type}']
+                for duration_type in DURATION_HOURS
+            })
+        return bikes
+
+    @api.model
+    @tools.ormcache('company_id', 'version')
+    def _get_cached_pricing_matrix(self, company_id, version):
+        """Tableau des tarifs publies, pret a afficher, pour chaque saison de la grille.
+
+        season -> bike_type -> {'prices': {duration_type: prix}, 'deposit': caution}.
+        Les saisons haute et basse ne figurent que si la grille en definit et
+        reprennent les tarifs 'toute l'annee' pour les cases manquantes.
+        """
+        grid = self._get_pricing_grid(company_id, version)
+        seasons = ['all'] + [
+            season for season in ('high', 'low')
+            if any(key[2] == season for key in grid)
+        ]
+        bike_types = {key[0] for key in grid}
+        matrix = {}
+        for season in seasons:
+            matrix[season] = {}
+            for bike_type in bike_types:
+                rows = {
+                    duration_type: self._resolve_grid_row(grid, bike_type, duration_type, season)
+                    for duration_type in DURATION_HOURS
+                }
+                rows = {duration_type: row for duration_type, row in rows.items() if row}
+                if not rows:
+                    continue
+                matrix[season][bike_type] = {
+                    'prices': {duration_type: row[0] for duration_type, row in rows.items()},
+                    'deposit': next((row[1] for row in rows.values() if row[1]), 0.0),
+                }
+        return matrix
+
+    @api.model
+    def _resolve_grid_row(self, grid, bike_type, duration_type, season='all'):
+        """Ligne de grille pour la saison demandee, avec repli sur 'toute l'annee'."""
+        return grid.get((bike_type, duration_type, season)) or grid.get((bike_type, duration_type, 'all'))
+
+    @api.model
+    def get_prices(self, keys):
+        """Prix de la grille pour plusieurs cles (bike_type, duration_type, season).
+
+        Les cles sont resolues (replis de saison compris) sur la grille en cache
+        de la societe courante: aucune requete une fois le cache chaud.
+        """
+        grid = self._get_pricing_grid(self.env.company.id)
+        prices = {}
+        for key in keys:
+            bike_type, duration_type, season = key
+            row = self._resolve_grid_row(grid, bike_type, duration_type, season or 'all')
+            prices[key] = row[0] if row else 0.0
+        return prices
+
+    @api.model
+    def _get_season(self, date):
+        if date and date.month in HIGH_SEASON_MONTHS:
+            return 'high'
+        if date and date.month in LOW_SEASON_MONTHS:
+            return 'low'
+        return 'all'
+
+    @api.model
+    def _get_duration(self, date_start, date_end, duration_type):
+        """Nombre d'unites de duree entre deux dates (au moins 1, sauf a l'heure)."""
+        if not date_start or not date_end or duration_type not in DURATION_HOURS:
+            return 1
+        total_hours = (date_end - date_start).total_seconds() / 3600
+        if duration_type == 'hour':
+            return int(total_hours)
+        return max(1, int(total_hours / DURATION_HOURS[duration_type]))
+
+    @api.model
+    def quote_many(self, bikes, date_start, date_end, duration_type):
+        """Devis de location pour un lot de velos sur une meme periode.
+
+        Le prix unitaire est le prix propre au velo, remplace par la grille
+        lorsqu'une ligne existe pour la saison de ``date_start``; a defaut, le
+        prix 'toute l'annee' de la grille. La ligne de grille retenue fournit
+        la caution, la duree minimum et la majoration week-end.
+
+        Retourne ``{bike_id: {'unit_price', 'duration', 'subtotal', 'deposit'}}``.
+        """
+        date_start = fields.Datetime.to_datetime(date_start)
+        date_end = fields.Datetime.to_datetime(date_end)
+        version = self._get_pricing_version()
+        grid = self._get_pricing_grid(self.env.company.id, version)
+        bike_table = self._get_bike_price_table(self.env.company.id, version)
+        season = self._get_season(date_start)
+        is_weekend = bool(date_start) and date_start.weekday() >= 5
+        duration = self._get_duration(date_start, date_end, duration_type)
+
+        quotes = {}
+        for bike in bikes:
+            bike_id = bike._origin.id or bike.id
+            if bike_id in bike_table:
+                bike_type, bike_prices = bike_table[bike_id]
+            else:
+                # Velo pas encore en base (onchange) ou d'une autre societe
+                bike_type = bike.bike_type
+                bike_prices = {d: bike[f'rental_price_{d}'] for d in DURATION_HOURS}
+            quotes[bike_id] = self._quote(
+                grid, bike_type, bike_prices, duration_type, season, is_weekend, duration,
+            )
+        return quotes
+
+    @api.model
+    def quote_items(self, items):
+        """Devis pour une liste de demandes heterogenes, sans lecture d'enregistrement.
+
+        ``items`` contient des tuples ``(bike_id, bike_type, date_start, date_end,
+        duration_type)``: le velo s'il est donne, sinon le type de velo (prix de
+        la grille). Tout est resolu sur les tables tarifaires en cache.
+        """
+        version = self._get_pricing_version()
+        grid = self._get_pricing_grid(self.env.company.id, version)
+        bike_table = self._get_bike_price_table(self.env.company.id, version)
+        quotes = []
+        for bike_id, bike_type, date_start, date_end, duration_type in items:
+            bike_prices = {}
+            if bike_id in bike_table:
+                bike_type, bike_prices = bike_table[bike_id]
+            quotes.append(self._quote(
+                grid, bike_type, bike_prices, duration_type,
+                self._get_season(date_start),
+                bool(date_start) and date_start.weekday() >= 5,
+                self._get_duration(date_start, date_end, duration_type),
+            ))
+        return quotes
+
+    @api.model
+    def _quote(self, grid, bike_type, bike_prices, duration_type, season, is_weekend, duration):
+        """Devis d'un velo a partir de la grille et de ses prix propres (voir quote_many)."""
+        row = self._resolve_grid_row(grid, bike_type, duration_type, season)
+
+        if season != 'all' and (bike_type, duration_type, season) in grid:
+            # Un tarif de saison prime sur le prix propre au velo
+            unit_price = row[0]
+        else:
+            unit_price = bike_prices.get(duration_type) or (row[0] if row else 0.0)
+        if row and is_weekend and row[3]:
+            unit_price *= 1 + row[3] / 100
+        billed = max(duration, row[2]) if row else duration
+        return {
+            'unit_price': unit_price,
+            'duration': billed,
+            'subtotal': unit_price * billed,
+            'deposit': row[1] if row and row[1] else unit_price * 2,
+        }
+
     @api.model
     def get_price(self, bike_type, duration_type, season='all'):
-        pricing = self.search([
-            ('bike_type', '=', bike_type),
-            ('duration_type', '=', duration_type),
-            ('season', '=', season),
-        ], limit=1)
-        if not pricing and season != 'all':
-            pricing = self.search([
-                ('bike_type', '=', bike_type),
-                ('duration_type', '=', duration_type),
-                ('season', '=', 'all'),
-            ], limit=1)
-        return pricing.price if pricing else 0.0
+        key = (bike_type, duration_type, season)
+        return self.get_prices([key])[key]
@@ -1,2 +1,4 @@
 from . import rental_wizard
 from . import extend_rental_wizard
+from . import rental_invoice_wizard
+from . import accessory_restock_wizard
@@ -0,0 +1,121 @@
+import math
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+
+class BikeAccessoryRestockWizard(models.TransientModel):
+    _name = 'bike.accessory.restock.wizard'
+    _description = 'Assistant de reapprovisionnement des accessoires'
+
+    accessory_ids = fields.Many2many(
+        'bike.accessory', string='Accessoires',
+        default=lambda self: self.env['bike.accessory'].search([('is_low_stock', '=', True)]),
+    )
+    period_days = fields.Integer(string='Historique (jours)', default=30, required=True,
+                                 help="Periode de consommation observee pour les suggestions.")
+    coverage_days = fields.Integer(string='Couverture (jours)', default=30, required=True,
+                                   help="Nombre de jours de consommation a couvrir apres reapprovisionnement.")
+    line_ids = fields.One2many('bike.accessory.restock.wizard.line', 'wizard_id', string='Lignes',
+                               compute='_compute_line_ids', store=True, readonly=False)
+    note = fields.Char(string='Reference', help="Bon de livraison, fournisseur...")
+
+    @api.depends('accessory_ids', 'period_days', 'coverage_days')
+    def _compute_line_ids(self):
+        for wizard in self:
+            accessories = wizard.accessory_ids._origin
+            consumption = wizard._get_consumption(accessories)
+            lines = [(5, 0, 0)]
+            for accessory in accessories:
+                consumed = consumption.get(accessory.id, 0)
+                expected = consumed * wizard.coverage_days / max(wizard.period_days, 1)
+                suggested = max(0, math.ceil(accessory.stock_min + expected - accessory.available_quantity))
+                lines.append((0, 0, {
+                    'accessory_id': accessory.id,
+                    'consumed_quantity': consumed,
+                    'suggested_quantity': suggested,
+                    'quantity': suggested,
+                }))
+            wizard.line_ids = lines
+
+    def _get_consumption(self, accessories):
+        """Quantites consommees par accessoire sur la periode.
+
+        Reservations des locations (registre de stock) et ventes confirmees
+        (lignes de commande du produit associe), une requete groupee chacune.
+        """
+        if not accessories:
+            return {}
+        since = fields.Datetime.now() - timedelta(days=self.period_days)
+        reserved = self.env['bike.accessory.move']._read_group(
+            [
+                ('accessory_id', 'in', accessories.ids),
+                ('move_type', '=', 'reserve'),
+                ('date', '>=', since),
+            ],
+            ['accessory_id'], ['quantity:sum'],
+        )
+        consumption = {accessory.id: quantity for accessory, quantity in reserved}
+
+        accessory_by_product = {
+            accessory.product_id.id: accessory.id for accessory in accessories.filtered('product_id')
+        }
+        if accessory_by_product:
+            sold = self.env['sale.order.line']._read_group(
+                [
+                    ('product_id', 'in', list(accessory_by_product)),
+                    ('order_id.state', '=', 'sale'),
+                    ('order_id.date_order', '>=', since),
+                ],
+                ['product_id'], ['product_uom_qty:sum'],
+            )
+            for product, quantity in sold:
+                accessory_id = accessory_by_product[product.id]
+                consumption[accessory_id] = consumption.get(accessory_id, 0) + round(quantity)
+        return consumption
+
+    def action_apply(self):
+        self.ensure_one()
+        lines = self.line_ids.filtered(lambda line: line.quantity > 0)
+        if not lines:
+            raise UserError("Aucune quantite a reapprovisionner.")
+        note = f"Reapprovisionnement {self.note}" if self.note else "Reapprovisionnement"
+        self.env['bike.accessory']._apply_stock_moves([{
+            'accessory_id': line.accessory_id.id,
+            'move_type': 'in',
+            'quantity': line.quantity,
+            'note': note,
+        } for line in lines])
+        total = sum(lines.mapped('quantity'))
+        # Une trace par accessoire dans son historique, creees en un lot
+        lines.accessory_id._message_log_batch({
+            line.accessory_id.id: f"{note}: +{line.quantity} unite(s), "
+                                  f"stock {line.accessory_id.stock_quantity}."
+            for line in lines
+        })
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': "Reapprovisionnement",
+                'message': f"{len(lines)} accessoire(s) reapprovisionne(s), {total} unite(s) ajoutee(s).",
+                'type': 'success',
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
+
+
+class BikeAccessoryRestockWizardLine(models.TransientModel):
+    _name = 'bike.accessory.restock.wizard.line'
+    _description = 'Ligne de reapprovisionnement'
+
+    wizard_id = fields.Many2one('bike.accessory.restock.wizard', string='Wizard', required=True,
+                                ondelete='cascade')
+    accessory_id = fields.Many2one('bike.accessory', string='Accessoire', required=True)
+    stock_quantity = fields.Integer(related='accessory_id.stock_quantity')
+    available_quantity = fields.Integer(related='accessory_id.available_quantity')
+    stock_min = fields.Integer(related='accessory_id.stock_min')
+    consumed_quantity = fields.Integer(string='Consommation', readonly=True)
+    suggested_quantity = fields.Integer(string='Suggestion', readonly=True)
+    quantity = fields.Integer(string='Quantite a ajouter')
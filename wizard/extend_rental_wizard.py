@@ -2,6 +2,14 @@ from odoo import models, fields, api
 from odoo.exceptions import ValidationError, UserError
 from datetime import timedelta
 
+# Unite de prolongation -> unite de tarification
+EXTENSION_DURATION_TYPES = {
+    'hours': 'hour',
+    'days': 'day',
+    'weeks': 'week',
+    'months': 'month',
+}
+
 
 class BikeRentalExtendWizard(models.TransientModel):
     _name = 'bike.rental.extend.wizard'
@@ -60,19 +68,11 @@ class BikeRentalExtendWizard(models.TransientModel):
         for wizard in self:
             if wizard.rental_id and wizard.extension_duration:
                 bike = wizard.rental_id.bike_id
-                
-                if wizard.extension_type == 'hours':
-                    unit_price = bike.rental_price_hour or 0
-                elif wizard.extension_type == 'days':
-                    unit_price = bike.rental_price_day or 0
-                elif wizard.extension_type == 'weeks':
-                    unit_price = bike.rental_price_week or 0
-                elif wizard.extension_type == 'months':
-                    unit_price = bike.rental_price_month or 0
-                else:
-                    unit_price = 0
-
-                extension_cost = unit_price * wizard.extension_duration
+                quote = self.env['bike.rental.pricing'].quote_many(
+                    bike, wizard.current_date_end, wizard.new_date_end,
+                    EXTENSION_DURATION_TYPES.get(wizard.extension_type),
+                )[bike.id]
+                extension_cost = quote['unit_price'] * wizard.extension_duration
                 
                 if wizard.apply_discount and wizard.discount_percent > 0:
                     discount = extension_cost * wizard.discount_percent / 100
@@ -96,17 +96,12 @@ class BikeRentalExtendWizard(models.TransientModel):
         if self.rental_id.state not in ['confirmed', 'ongoing', 'overdue']:
             raise UserError("Seule une location en cours ou confirmee peut etre prolongee.")
 
-        overlapping = self.env['bike.rental'].search([
-            ('id', '!=', self.rental_id.id),
-            ('bike_id', '=', self.bike_id.id),
-            ('state', 'not in', ['cancelled', 'returned']),
-            ('date_start', '<', self.new_date_end),
-            ('date_end', '>', self.rental_id.date_end),
+        Rental = self.env['bike.rental']
+        conflicts = Rental._get_bike_conflicts([
+            (self.bike_id.id, self.rental_id.date_end, self.new_date_end, self.rental_id.id),
         ])
-        if overlapping:
-            raise ValidationError(
-                f"Le velo {self.bike_id.name} est deja reserve pour la periode de prolongation."
-            )
+        if conflicts:
+            Rental._raise_bike_conflicts(conflicts, period_label="la periode de prolongation")
 
         old_date_end = self.rental_id.date_end
         old_total = self.rental_id.total_price
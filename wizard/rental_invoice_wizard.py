@@ -0,0 +1,64 @@
+from markupsafe import Markup
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+
+class BikeRentalInvoiceWizard(models.TransientModel):
+    _name = 'bike.rental.invoice.wizard'
+    _description = 'Assistant de facturation des locations'
+
+    rental_ids = fields.Many2many('bike.rental', string='Locations')
+    group_by = fields.Selection([
+        ('customer', 'Une facture par client'),
+        ('contract', 'Une facture par contrat'),
+        ('rental', 'Une facture par location'),
+    ], string='Regroupement', required=True, default='customer')
+
+    invoiceable_count = fields.Integer(string='Locations a facturer', compute='_compute_summary')
+    skipped_count = fields.Integer(string='Locations ignorees', compute='_compute_summary')
+    invoice_count = fields.Integer(string='Factures a creer', compute='_compute_summary')
+    amount_total = fields.Monetary(string='Montant total HT', compute='_compute_summary',
+                                   currency_field='currency_id')
+    summary = fields.Html(string='Apercu', compute='_compute_summary')
+    currency_id = fields.Many2one('res.currency', string='Devise',
+                                  default=lambda self: self.env.company.currency_id)
+
+    @api.depends('rental_ids', 'group_by')
+    def _compute_summary(self):
+        for wizard in self:
+            invoiceable = wizard.rental_ids._get_invoiceable()
+            groups = invoiceable._group_for_invoicing(wizard.group_by)
+            rows = []
+            for rentals in groups.values():
+                amount = sum(rentals.mapped('total_price')) + sum(rentals.mapped('late_fee'))
+                # Markup.format echappe les noms saisis (client, contrat)
+                rows.append(Markup("<tr><td>{}</td><td>{}</td><td>{}</td><td>{:.2f} {}</td></tr>").format(
+                    rentals[0].customer_id.name or '',
+                    rentals[0].contract_id.name or '',
+                    len(rentals),
+                    amount,
+                    wizard.currency_id.symbol or '',
+                ))
+            wizard.invoiceable_count = len(invoiceable)
+            wizard.skipped_count = len(wizard.rental_ids) - len(invoiceable)
+            wizard.invoice_count = len(groups)
+            wizard.amount_total = sum(invoiceable.mapped('total_price')) + sum(invoiceable.mapped('late_fee'))
+            wizard.summary = Markup(
+                "<table class='table table-sm'><thead><tr><th>Client</th><th>Contrat</th>"
+                "<th>Locations</th><th>Montant</th></tr></thead><tbody>{}</tbody></table>"
+            ).format(Markup('').join(rows)) if rows else False
+
+    def action_create_invoices(self):
+        self.ensure_one()
+        invoices = self.rental_ids._create_invoices(group_by=self.group_by)
+        if not invoices:
+            raise UserError("Aucune location a facturer (deja facturees, en brouillon ou annulees).")
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Factures',
+            'res_model': 'account.move',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', invoices.ids)],
+            'target': 'current',
+        }
@@ -26,12 +26,15 @@ class BikeRentalWizard(models.TransientModel):
     ], string='Type de duree', required=True, default='day')
 
     bike_ids = fields.Many2many('bike.bike', string='Velos a louer',
-                                domain=[('is_for_rent', '=', True), ('state', '=', 'available')])
+                                domain=[('available_between', '=', True)])
     
     line_ids = fields.One2many('bike.rental.wizard.line', 'wizard_id', string='Lignes de location')
 
     include_accessories = fields.Boolean(string='Inclure des accessoires', default=False)
-    accessory_ids = fields.Many2many('bike.accessory', string='Accessoires')
+    accessory_ids = fields.Many2many('bike.accessory', string='Accessoires',
+                                     domain=[('available_quantity', '>', 0)])
+    suggested_accessory_ids = fields.Many2many('bike.accessory', string='Accessoires suggeres',
+                                               compute='_compute_suggested_accessory_ids')
 
     total_amount = fields.Monetary(string='Montant total', compute='_compute_totals',
                                    currency_field='currency_id')
@@ -51,36 +54,31 @@ class BikeRentalWizard(models.TransientModel):
             wizard.total_amount = subtotal - discount
             wizard.total_deposit = sum(wizard.line_ids.mapped('deposit'))
 
+    @api.depends('bike_ids')
+    def _compute_suggested_accessory_ids(self):
+        for wizard in self:
+            wizard.suggested_accessory_ids = wizard.bike_ids._origin._get_suggested_accessories()
+
+    @api.onchange('include_accessories')
+    def _onchange_include_accessories(self):
+        if self.include_accessories and not self.accessory_ids:
+            self.accessory_ids = self.suggested_accessory_ids
+
     @api.onchange('bike_ids', 'date_start', 'date_end', 'duration_type')
     def _onchange_bikes(self):
         if self.bike_ids:
+            quotes = self.env['bike.rental.pricing'].quote_many(
+                self.bike_ids, self.date_start, self.date_end, self.duration_type,
+            )
             lines = []
             for bike in self.bike_ids:
-                price_field = f'rental_price_{self.duration_type}'
-                unit_price = getattr(bike, price_field, 0) or 0
-                
-                if self.date_start and self.date_end:
-                    delta = self.date_end - self.date_start
-                    total_hours = delta.total_seconds() / 3600
-                    
-                    if self.duration_type == 'hour':
-                        duration = int(total_hours)
-                    elif self.duration_type == 'day':
-                        duration = max(1, int(total_hours / 24))
-                    elif self.duration_type == 'week':
-                        duration = max(1, int(total_hours / 168))
-                    elif self.duration_type == 'month':
-                        duration = max(1, int(total_hours / 720))
-                    else:
-                        duration = 1
-                else:
-                    duration = 1
-
+                bike_id = bike._origin.id or bike.id
+                quote = quotes[bike_id]
                 lines.append((0, 0, {
-                    'bike_id': bike.id,
-                    'unit_price': unit_price,
-                    'duration': duration,
-                    'deposit': unit_price * 2,
+                    'bike_id': bike_id,
+                    'unit_price': quote['unit_price'],
+                    'duration': quote['duration'],
+                    'deposit': quote['deposit'],
                 }))
             self.line_ids = [(5, 0, 0)] + lines
 
@@ -97,17 +95,19 @@ class BikeRentalWizard(models.TransientModel):
         if not self.line_ids:
             raise UserError("Veuillez ajouter au moins un velo a louer.")
 
-        for line in self.line_ids:
-            overlapping = self.env['bike.rental'].search([
-                ('bike_id', '=', line.bike_id.id),
-                ('state', 'not in', ['cancelled', 'returned']),
-                ('date_start', '<', self.date_end),
-                ('date_end', '>', self.date_start),
-            ])
-            if overlapping:
-                raise ValidationError(
-                    f"Le velo {line.bike_id.name} n'est pas disponible pour cette periode."
-                )
+        Rental = self.env['bike.rental']
+        conflicts = Rental._get_bike_conflicts([
+            (bike.id, self.date_start, self.date_end, False)
+            for bike in self.line_ids.bike_id
+        ])
+        if conflicts:
+            Rental._raise_bike_conflicts(conflicts)
+        if self.include_accessories:
+            # Une unite de chaque accessoire par location, lue sur le disponible stocke
+            short = self.accessory_ids.filtered(lambda a: a.available_quantity < len(self.line_ids))
+            if short:
+                details = ', '.join(f"{a.name} ({a.available_quantity} disponible(s))" for a in short)
+                raise UserError(f"Stock insuffisant pour les accessoires suivants: {details}")
 
         contract = False
         if self.create_contract:
@@ -121,27 +121,18 @@ class BikeRentalWizard(models.TransientModel):
                 'terms_accepted': True,
             })
 
-        rentals = self.env['bike.rental']
-        for line in self.line_ids:
-            rental_vals = {
-                'bike_id': line.bike_id.id,
-                'customer_id': self.customer_id.id,
-                'date_start': self.date_start,
-                'date_end': self.date_end,
-                'duration_type': self.duration_type,
-                'unit_price': line.unit_price,
-                'deposit': line.deposit,
-                'notes': self.notes,
-            }
-            if contract:
-                rental_vals['contract_id'] = contract.id
-            if self.include_accessories and self.accessory_ids:
-                rental_vals['accessories_ids'] = [(6, 0, self.accessory_ids.ids)]
-            
-            rental = self.env['bike.rental'].create(rental_vals)
-            rentals |= rental
+        if len(self.line_ids) >= self.env['bike.rental.batch.job']._get_async_threshold():
+            return self._queue_rental_job(contract)
+
+        accessories = self.accessory_ids if self.include_accessories else None
+        vals_list = [Rental._prepare_batch_vals(self, line, contract, accessories) for line in self.line_ids]
+        rentals = Rental._create_batch(vals_list)
 
         if contract:
+            contract.message_post(
+                body=f"{len(rentals)} location(s) creee(s): {', '.join(rentals.mapped('name'))}",
+                subject="Locations creees",
+            )
             return {
                 'type': 'ir.actions.act_window',
                 'name': 'Contrat cree',
@@ -170,6 +161,37 @@ class BikeRentalWizard(models.TransientModel):
                     'target': 'current',
                 }
 
+    def _queue_rental_job(self, contract):
+        """Confie la creation des locations a un traitement en arriere-plan."""
+        job = self.env['bike.rental.batch.job'].create({
+            'name': f"{len(self.line_ids)} locations - {self.customer_id.name}",
+            'customer_id': self.customer_id.id,
+            'contract_id': contract.id if contract else False,
+            'date_start': self.date_start,
+            'date_end': self.date_end,
+            'duration_type': self.duration_type,
+            'notes': self.notes,
+            'accessory_ids': [(6, 0, self.accessory_ids.ids)] if self.include_accessories else [],
+            'line_ids': [(0, 0, {
+                'bike_id': line.bike_id.id,
+                'unit_price': line.unit_price,
+                'deposit': line.deposit,
+            }) for line in self.line_ids],
+        })
+        job._trigger_processing()
+        (contract or job).message_post(
+            body=f"Creation de {len(self.line_ids)} location(s) planifiee(s) en arriere-plan.",
+            subject="Locations en cours de creation",
+        )
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Contrat cree' if contract else 'Traitement en masse',
+            'res_model': contract._name if contract else job._name,
+            'res_id': contract.id if contract else job.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
 
 class BikeRentalWizardLine(models.TransientModel):
     _name = 'bike.rental.wizard.line'
@@ -177,7 +199,7 @@ class BikeRentalWizardLine(models.TransientModel):
 
     wizard_id = fields.Many2one('bike.rental.wizard', string='Wizard', required=True, ondelete='cascade')
     bike_id = fields.Many2one('bike.bike', string='Velo', required=True,
-                              domain=[('is_for_rent', '=', True), ('state', '=', 'available')])
+                              domain=[('available_between', '=', True)])
     
     unit_price = fields.Monetary(string='Prix unitaire', currency_field='currency_id')
     duration = fields.Integer(string='Duree', default=1)
@@ -194,7 +216,10 @@ class BikeRentalWizardLine(models.TransientModel):
     @api.onchange('bike_id')
     def _onchange_bike(self):
         if self.bike_id and self.wizard_id:
-            duration_type = self.wizard_id.duration_type
-            price_field = f'rental_price_{duration_type}'
-            self.unit_price = getattr(self.bike_id, price_field, 0) or 0
-            self.deposit = self.unit_price * 2
+            wizard = self.wizard_id
+            quote = self.env['bike.rental.pricing'].quote_many(
+                self.bike_id, wizard.date_start, wizard.date_end, wizard.duration_type,
+            )[self.bike_id._origin.id or self.bike_id.id]
+            self.unit_price = quote['unit_price']
+            self.duration = quote['duration']
+            self.deposit = quote['deposit']